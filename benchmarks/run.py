@@ -0,0 +1,362 @@
+import numpy as np
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.synthetic import (make_fluorescence_trace, make_image_metadata, make_movie, make_trial_metadata,
+                                  make_traces)
+
+
+# Registry of benchmarks, each mapping a scale to a setup function and a function to time
+BENCHMARKS: dict[str, Callable[[float], tuple[Callable[[], tuple], Callable]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Register a benchmark under the given name. The decorated function takes a
+    scale and returns a setup function, which is called before every run and
+    returns the arguments, and the function to time.
+    :param name: The name of the benchmark.
+    :return: A decorator registering the benchmark.
+    """
+
+    def register(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+@benchmark('find_local_max')
+def bench_find_local_max(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Find local maxima in the mean fluorescences of a whole session.
+    """
+
+    from src.caiman_preprocessing import find_local_max
+    trace = make_fluorescence_trace(frames=int(21000 * scale), margin=50)
+    return lambda: (trace, 20, 50), find_local_max
+
+
+@benchmark('replace_rows')
+def bench_replace_rows(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Replace rows around every line artifact in a movie.
+    """
+
+    from src.caiman_preprocessing import replace_rows
+    movie, peaks = make_movie(frames=max(int(500 * scale), 4 * 51))
+
+    def run(movie_edit: np.ndarray, movie_dgn: np.ndarray) -> None:
+        for point in peaks:
+            replace_rows(movie_edit, movie_dgn, point, 0, 25, 50)
+
+    return lambda: (np.copy(movie), movie), run
+
+
+@benchmark('online_line_removal')
+def bench_online_line_removal(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Remove line artifacts and blank frames from a movie streamed frame by frame.
+    """
+
+    from src.caiman_preprocessing_hyperparams import Hyperparams
+    from src.online_line_removal import remove_lines_online
+    movie = make_movie(frames=max(int(500 * scale), 4 * 51))[0]
+    hyp = Hyperparams(name='synthetic')
+    hyp.set_lr_params(local_max_thr=20, local_max_rad=50, channel_thr=0, correction_thr=25, correction_rad=50)
+
+    def run() -> None:
+        for _ in remove_lines_online(movie, hyp):
+            pass
+
+    return lambda: (), run
+
+
+@benchmark('image_desc_to_datetime')
+def bench_image_desc_to_datetime(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Parse the time of every frame from its image description.
+    """
+
+    from src.datetime import image_desc_to_datetime
+    image_info = make_image_metadata(frames=int(21000 * scale))
+
+    def run() -> None:
+        for i in range(image_info.size):
+            image_desc_to_datetime(image_info[i][0][0])
+
+    return lambda: (), run
+
+
+@benchmark('timestamp_to_datetime')
+def bench_timestamp_to_datetime(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Convert the start and end timestamps of every trial.
+    """
+
+    from src.datetime import timestamp_to_datetime
+    trial_info = make_trial_metadata(frames=int(21000 * scale))
+
+    def run() -> None:
+        for i in range(trial_info.size):
+            timestamp_to_datetime(trial_info[i][0][0])
+            timestamp_to_datetime(trial_info[i][0][-1])
+
+    return lambda: (), run
+
+
+@benchmark('add_frames_to_datetime')
+def bench_add_frames_to_datetime(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Find the time of every event in every trial.
+    """
+
+    from src.datetime import add_frames_to_datetime
+    trial_info = make_trial_metadata(frames=int(21000 * scale))
+    time_start = np.datetime64('2021-05-26T13:45:12.345678')
+
+    def run() -> None:
+        for i in range(trial_info.size):
+            for field in range(2, len(trial_info.dtype.names)):
+                add_frames_to_datetime(time_start, trial_info[i][field][0][0], 160)
+
+    return lambda: (), run
+
+
+@benchmark('datetime_to_frame')
+def bench_datetime_to_frame(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Convert the time of every frame in a session into a frame number.
+    """
+
+    from src.datetime import datetime_to_frame
+    time_start = np.datetime64('2021-05-26T13:45:12.345678')
+    times = time_start + (np.arange(int(21000 * scale)) / 4.5 * 10 ** 6).astype('timedelta64[us]')
+    return lambda: (times, time_start, 0, 4.5), datetime_to_frame
+
+
+def _trial_intervals(scale: float, interval_n: int) -> tuple[np.ndarray, list[tuple[int, int]]]:
+    """
+    Create traces and the first and last frames of one interval per trial.
+    :param scale: The scale of the benchmark.
+    :param interval_n: The number of frames in each interval.
+    :return: A tuple containing the traces and a list of frame bounds,
+        respectively.
+    """
+
+    frames = int(21000 * scale)
+    traces = make_traces(frames=frames)
+    starts = np.linspace(0, frames - 2 * interval_n, 100).astype(np.int64)
+    return traces, [(int(start), int(start) + interval_n + start % 5) for start in starts]
+
+
+@benchmark('interpolate')
+def bench_interpolate(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Interpolate one interval of every trial.
+    """
+
+    from src.interpolate import interpolate
+    traces, bounds = _trial_intervals(scale, 60)
+    time_ref = np.datetime64('2021-05-26T13:45:12.345678')
+
+    def run() -> None:
+        for frame_start, frame_end in bounds:
+            time_start = time_ref + np.timedelta64(int(frame_start / 4.5 * 10 ** 6), 'us')
+            time_end = time_ref + np.timedelta64(int(frame_end / 4.5 * 10 ** 6), 'us')
+            interpolate(traces, 60, time_start, time_end, frame_start, frame_end, 4.5)
+
+    return lambda: (), run
+
+
+@benchmark('stitch')
+def bench_stitch(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Stitch one interval of every trial.
+    """
+
+    from src.interpolate import stitch
+    traces, bounds = _trial_intervals(scale, 60)
+
+    def run() -> None:
+        for frame_start, frame_end in bounds:
+            stitch(traces, [2, 2], frame_start, frame_end, 4.5)
+
+    return lambda: (), run
+
+
+@benchmark('truncate')
+def bench_truncate(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Truncate one interval of every trial.
+    """
+
+    from src.interpolate import truncate
+    traces, bounds = _trial_intervals(scale, 60)
+
+    def run() -> None:
+        for frame_start, _ in bounds:
+            np.copy(truncate(traces, 20, frame_start))
+
+    return lambda: (), run
+
+
+@benchmark('centered_trial_average')
+def bench_centered_trial_average(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Compute centered trial averages of a tensor with one stimulus.
+    """
+
+    from src.tensor import centered_trial_average
+    tensor = np.random.default_rng(0).standard_normal((max(int(100 * scale), 2), 1500, 1, 200))
+    return lambda: (tensor, 0, 1), centered_trial_average
+
+
+@benchmark('minmax')
+def bench_minmax(scale: float) -> tuple[Callable[[], tuple], Callable]:
+    """
+    Min-max normalize a two-dimensional version of a tensor.
+    """
+
+    from src.tensor import minmax
+    tensor_2d = make_traces(frames=max(int(100 * scale), 1) * 200)
+    return lambda: (tensor_2d, 1), minmax
+
+
+def run_benchmark(name: str, scale: float, repeat: int) -> dict:
+    """
+    Time a benchmark and measure its peak traced memory.
+    :param name: The name of the benchmark.
+    :param scale: The scale of the synthetic data relative to a real session.
+    :param repeat: The number of timed runs.
+    :return: A dictionary of results. If the benchmark cannot be imported or
+        raises an error, the dictionary only records why it was skipped or
+        how it failed.
+    """
+
+    # Skip benchmarks whose dependencies are missing
+    try:
+        setup, func = BENCHMARKS[name](scale)
+    except ImportError as error:
+        return {'skipped': str(error)}
+
+    try:
+
+        # Time each run separately
+        times = []
+        for _ in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+
+        # Measure peak memory in a separate run since tracing slows everything down
+        args = setup()
+        tracemalloc.start()
+        func(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+
+    # Record the error instead of aborting the remaining benchmarks
+    except Exception as error:
+        return {'failed': '{}: {}'.format(type(error).__name__, error)}
+    finally:
+        tracemalloc.stop()
+
+    return {'time_min': min(times), 'time_median': float(np.median(times)), 'peak_memory': peak_memory}
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_time: float, min_memory: int) -> list[str]:
+    """
+    Compare results with a baseline. Increases smaller than the given minimums
+    are ignored since they are dominated by noise.
+    :param results: The results of the current run.
+    :param baseline: The results of a previous run.
+    :param threshold: The largest allowed relative increase in time or memory.
+    :param min_time: The smallest increase in seconds counted as a regression.
+    :param min_memory: The smallest increase in bytes counted as a regression.
+    :return: A list of messages describing each regression, including
+        benchmarks that fail but did not fail in the baseline.
+    """
+
+    regressions = []
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or 'skipped' in result or 'skipped' in base:
+            continue
+        if 'failed' in result or 'failed' in base:
+            if 'failed' not in base:
+                regressions.append('{}: failed ({})'.format(name, result['failed']))
+            continue
+        for key, minimum in [('time_min', min_time), ('peak_memory', min_memory)]:
+            if result[key] > base[key] * (1 + threshold) and result[key] - base[key] > minimum:
+                # A relative increase is undefined for a baseline of zero
+                change = '{:+.1%}'.format(result[key] / base[key] - 1) if base[key] else 'from zero'
+                regressions.append('{}: {} increased from {:.6g} to {:.6g} ({})'.format(
+                    name, key, base[key], result[key], change))
+    return regressions
+
+
+def main() -> None:
+    """
+    Run the benchmarks from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark hot paths of the src package on synthetic data.")
+    parser.add_argument('--output', help="Path to save the results to as JSON.")
+    parser.add_argument('--compare', help="Path to a JSON baseline to compare the results with.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Largest allowed relative increase in time or memory when comparing.")
+    parser.add_argument('--min-time', type=float, default=1e-3,
+                        help="Smallest increase in seconds counted as a regression when comparing.")
+    parser.add_argument('--min-memory', type=int, default=2 ** 20,
+                        help="Smallest increase in bytes counted as a regression when comparing.")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of timed runs of each benchmark.")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Size of the synthetic data relative to a real session.")
+    parser.add_argument('--filter', default='', help="Only run benchmarks with this string in their name.")
+    args = parser.parse_args()
+
+    # Run every selected benchmark
+    results = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                 'scale': args.scale, 'repeat': args.repeat},
+        'results': {}
+    }
+    for name in BENCHMARKS:
+        if args.filter in name:
+            result = run_benchmark(name, args.scale, args.repeat)
+            results['results'][name] = result
+            if 'skipped' in result:
+                print('{:<25} skipped ({})'.format(name, result['skipped']))
+            elif 'failed' in result:
+                print('{:<25} failed ({})'.format(name, result['failed']))
+            else:
+                print('{:<25} {:>10.4f} s {:>10.1f} MiB'.format(name, result['time_min'],
+                                                                result['peak_memory'] / 2 ** 20))
+
+    # Save the results if specified
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    # Compare with the baseline if specified and fail on any regression
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline['meta']['scale'] != args.scale:
+            sys.exit("The baseline was run with a different scale.")
+        regressions = compare(results, baseline, args.threshold, args.min_time, args.min_memory)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+def make_movie(frames: int, height: int = 320, width: int = 256, n_artifacts: int = 3, n_blank: int = 10,
+               artifact_rows: int = 20, artifact_rad: int = 5, seed: int = 0) -> tuple[np.ndarray, list[int]]:
+    """
+    Create a float32 calcium imaging movie with line artifacts and blank
+    frames. Each line artifact is a band of bright rows in the frames around
+    its peak, with the brightest band at the peak itself.
+    :param frames: The number of frames.
+    :param height: The number of pixel rows in each frame.
+    :param width: The number of pixel columns in each frame.
+    :param n_artifacts: The number of line artifacts.
+    :param n_blank: The number of blank (all zero) frames.
+    :param artifact_rows: The number of rows affected by each artifact.
+    :param artifact_rad: The number of frames on each side of a peak that are
+        also affected.
+    :param seed: A seed for random number generation.
+    :return: A tuple containing the movie and a sorted list of the frames
+        where artifacts peak, respectively.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Generate background fluorescence with a mean of about 10
+    movie = rng.gamma(shape=4, scale=2.5, size=(frames, height, width)).astype(np.float32)
+
+    # Place artifact peaks far enough from each other and from both ends of the movie
+    margin = frames // (n_artifacts + 1)
+    peaks = [margin * (i + 1) for i in range(n_artifacts)]
+
+    # Add bands of bright rows that fade with distance from each peak
+    for peak in peaks:
+        row = rng.integers(0, height - artifact_rows)
+        for offset in range(-artifact_rad, artifact_rad + 1):
+            brightness = 2000 / (1 + abs(offset))
+            movie[peak + offset, row:row + artifact_rows] += brightness
+
+    # Blank frames evenly spaced between the artifacts
+    for frame in np.linspace(1, frames - 2, n_blank).astype(np.int64):
+        if all(abs(frame - peak) > artifact_rad for peak in peaks):
+            movie[frame] = 0
+
+    return movie, peaks
+
+
+def make_fluorescence_trace(frames: int = 21000, n_artifacts: int = 20, margin: int = 0, seed: int = 0) -> np.ndarray:
+    """
+    Create a 1-D trace of mean fluorescences of the frames of a movie, with
+    occasional peaks caused by line artifacts.
+    :param frames: The number of frames.
+    :param n_artifacts: The number of peaks.
+    :param margin: The number of frames at each end of the trace that no peak
+        affects, e.g. the radius used to find local maxima.
+    :param seed: A seed for random number generation.
+    :return: A 1-D array of mean fluorescences.
+    """
+
+    rng = np.random.default_rng(seed)
+    trace = 10 + rng.standard_normal(frames)
+
+    # Place peaks evenly between the margins, far enough inside that their whole bump fits
+    inner = frames - 2 * (margin + 5)
+    for i in range(n_artifacts):
+        peak = margin + 5 + inner * (i + 1) // (n_artifacts + 1)
+        trace[peak - 5:peak + 6] += 40 / (1 + np.abs(np.arange(-5, 6)))
+    return trace
+
+
+def make_image_descriptions(frames: int = 21000, fr: float = 4.5,
+                            epoch: tuple = (2021, 5, 26, 13, 45, 12.345678)) -> list[str]:
+    """
+    Create ScanImage-style ImageDescription strings, one for each frame.
+    :param frames: The number of frames.
+    :param fr: The frame rate of imaging.
+    :param epoch: The year, month, day, hour, minute, and second that
+        acquisition started.
+    :return: A list of image descriptions.
+    """
+
+    epoch_str = '[' + ','.join(str(unit) for unit in epoch) + ']'
+    return [
+        'frameNumbers = {}\n'
+        'frameNumberAcquisition = {}\n'
+        'frameTimestamps_sec = {:.6f}\n'
+        'acqTriggerTimestamps_sec = \n'
+        'nextFileMarkerTimestamps_sec = \n'
+        'endOfAcquisition = 0\n'
+        'endOfAcquisitionMode = 0\n'
+        'dcOverVoltage = 0\n'
+        'epoch = {}\n'
+        'auxTrigger0 = []\n'
+        'auxTrigger1 = []\n'
+        'I2CData = {{}}\n'.format(i + 1, i + 1, i / fr, epoch_str)
+        for i in range(frames)
+    ]
+
+
+def make_image_metadata(frames: int = 21000, fr: float = 4.5,
+                        epoch: tuple = (2021, 5, 26, 13, 45, 12.345678)) -> np.ndarray:
+    """
+    Create image metadata shaped like a MAT-file struct array loaded with
+    scipy.io.loadmat and flattened.
+    :param frames: The number of frames.
+    :param fr: The frame rate of imaging.
+    :param epoch: The year, month, day, hour, minute, and second that
+        acquisition started.
+    :return: A structured array with the field 'ImageDescription'.
+    """
+
+    image_info = np.empty(frames, dtype=[('ImageDescription', 'O')])
+    for i, image_desc in enumerate(make_image_descriptions(frames, fr, epoch)):
+        image_info['ImageDescription'][i] = np.array([image_desc])
+    return image_info
+
+
+def make_traces(neurons: int = 1500, frames: int = 21000, seed: int = 0) -> np.ndarray:
+    """
+    Create a matrix of z-scored neural activity traces.
+    :param neurons: The number of neurons.
+    :param frames: The number of frames.
+    :param seed: A seed for random number generation.
+    :return: A (neurons, frames) array of traces.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Smooth random walks look more like calcium traces than white noise
+    traces = np.cumsum(rng.standard_normal((neurons, frames)), axis=1)
+    traces -= np.mean(traces, axis=1, keepdims=True)
+    traces /= np.std(traces, axis=1, ddof=1, keepdims=True)
+    return traces
+
+
+def make_trial_metadata(n_trials: int = 100, trial_fr: float = 160, image_fr: float = 4.5,
+                        frames: int = 21000, events_field: tuple = ('laseron', 'turn_frame', 'laseroff'),
+                        epoch: tuple = (2021, 5, 26, 13, 45, 12.345678), seed: int = 0) -> np.ndarray:
+    """
+    Create trial metadata shaped like a MAT-file struct array loaded with
+    scipy.io.loadmat and flattened. Trials evenly divide the imaging session.
+    :param n_trials: The number of trials.
+    :param trial_fr: The frame rate of the recorded trial information.
+    :param image_fr: The frame rate of imaging.
+    :param frames: The number of imaging frames in the session.
+    :param events_field: Names of fields containing frames when events occurred.
+    :param epoch: The year, month, day, hour, minute, and second that
+        imaging started.
+    :param seed: A seed for random number generation.
+    :return: A structured array with the fields 'timestamps', 'output', and
+        each event field.
+    """
+
+    rng = np.random.default_rng(seed)
+    dtype = [('timestamps', 'O'), ('output', 'O')] + [(field, 'O') for field in events_field]
+    trial_info = np.empty(n_trials, dtype=dtype)
+
+    # Find the length of each trial in seconds, leaving a gap between trials
+    trial_sec = frames / image_fr / n_trials
+    trial_n = int(trial_sec * 0.9 * trial_fr)
+
+    for trial in range(n_trials):
+
+        # Create a timestamp for every recorded sample in the trial
+        seconds = epoch[5] + trial * trial_sec + np.arange(trial_n) / trial_fr
+        timestamps = np.empty((trial_n, 6))
+        timestamps[:, :5] = epoch[:5]
+        timestamps[:, 4] += seconds // 60
+        timestamps[:, 5] = seconds % 60
+        timestamps[:, 3] += timestamps[:, 4] // 60
+        timestamps[:, 4] %= 60
+        trial_info['timestamps'][trial] = timestamps
+
+        # The first two trials are baselines
+        trial_info['output'][trial] = np.array(['baseline' if trial < 2 else 'left'])
+
+        # Spread events evenly through the trial with some jitter
+        for i, field in enumerate(events_field):
+            event = (i + 1) * trial_n // (len(events_field) + 1) + rng.integers(-trial_n // 20, trial_n // 20)
+            trial_info[field][trial] = np.array([[event]])
+
+    return trial_info
@@ -1,9 +1,18 @@
-import caiman as cm
-from caiman.base.movies import movie
+from __future__ import annotations
 
 import numpy as np
 
+import os
+from typing import Optional, TYPE_CHECKING
 
+from src.profiling import profile
+
+# CaImAn is slow to import, so it is only imported when needed
+if TYPE_CHECKING:
+    from caiman.base.movies import movie
+
+
+@profile
 def copy_data(orig: str, src: str) -> None:
     """
     Copy TIFF data to another directory.
@@ -11,10 +20,13 @@ def copy_data(orig: str, src: str) -> None:
     :param src: The path to where the data should be copied.
     """
 
+    import caiman as cm
+
     # Load the data and then save it
     cm.load(orig).save(src)
 
 
+@profile
 def find_local_max(data: np.ndarray, threshold: int, radius: int) -> list:
     """
     Given an array of ordered data, use a heuristic to find possible local
@@ -50,6 +62,7 @@ def find_local_max(data: np.ndarray, threshold: int, radius: int) -> list:
     return local_max
 
 
+@profile
 def replace_rows(data: movie, data_proxy: np.ndarray, index: int, channel_threshold: int,
                  correction_threshold: int, correction_radius: int) -> None:
     """
@@ -68,8 +81,9 @@ def replace_rows(data: movie, data_proxy: np.ndarray, index: int, channel_thresh
     # Get the range of frames to potentially correct
     lb, ub = index - correction_radius, index + correction_radius + 1
 
-    # Store the most recent pixel rows that are correct
-    last_known_good_config = data[lb]
+    # Store a copy of the most recent pixel rows that are correct, since saving rows into a view
+    # would overwrite the first frame
+    last_known_good_config = np.copy(data[lb])
 
     # Iterate through frames from oldest to newest
     for i in range(lb, ub):
@@ -87,3 +101,108 @@ def replace_rows(data: movie, data_proxy: np.ndarray, index: int, channel_thresh
                 data[i, j] = last_known_good_config[j]
             else:
                 last_known_good_config[j] = data[i, j]
+
+
+def _memmap_info(fname: str) -> tuple[tuple[int, ...], int, str]:
+    """
+    Parse the dimensions, number of frames, and order of a memory mapped file
+    from its CaImAn file name.
+    :param fname: The path of a file named like
+        '..._d1_{d1}_d2_{d2}_d3_{d3}_order_{order}_frames_{T}_.mmap'.
+    :return: A tuple containing the dimensions of each frame, the number of
+        frames, and the order ('C' or 'F'), respectively.
+    """
+
+    # Split the file name the same way CaImAn does
+    fpart = os.path.basename(fname).split('_')[1:-1]
+    d1, d2, d3, frames, order = int(fpart[-9]), int(fpart[-7]), int(fpart[-5]), int(fpart[-1]), fpart[-3]
+    dims = (d1, d2) if d3 == 1 else (d1, d2, d3)
+    return dims, frames, order
+
+
+def memmap_filename(base_name: str, dims: tuple[int, ...], frames: int, order: str = 'C') -> str:
+    """
+    Create the CaImAn file name of a memory mapped file.
+    :param base_name: The beginning of the file name, including any directory.
+    :param dims: The dimensions of each frame.
+    :param frames: The number of frames.
+    :param order: The order of the file ('C' or 'F').
+    :return: The file name.
+    """
+
+    d3 = 1 if len(dims) == 2 else dims[2]
+    return '{}_d1_{}_d2_{}_d3_{}_order_{}_frames_{}_.mmap'.format(base_name, dims[0], dims[1], d3, order, frames)
+
+
+@profile
+def memmap_piece(fname: str, proc_slice: Optional[tuple[slice, slice]] = None) -> np.memmap:
+    """
+    Open a memory mapped file saved by CaImAn as read-only images without
+    copying any data.
+    :param fname: The path of the memory mapped file, such as the file saved
+        by motion correction.
+    :param proc_slice: A rectangular slice of each frame, such as an element
+        of proc_slices. If None, the entire FOV is returned.
+    :return: A read-only strided view of shape (T, rows, columns).
+    """
+
+    # Open the pixels by frames matrix Yr in the order it was saved
+    dims, frames, order = _memmap_info(fname)
+    Yr = np.memmap(fname, mode='r', dtype=np.float32, shape=(int(np.prod(dims)), frames), order=order)
+
+    # Reshape into images like CaImAn does, which never copies for either order
+    images = np.reshape(Yr.T, [frames] + list(dims), order='F')
+    if proc_slice is None:
+        return images
+    return images[:, proc_slice[0], proc_slice[1]]
+
+
+@profile
+def save_memmap_pieces(fname: str, proc_slices: list[tuple[slice, slice]], base_names: list[str],
+                       chunk_frames: int = 1000, overwrite: bool = False) -> list[str]:
+    """
+    Save each subrectangle of a memory mapped file as its own C-order memory
+    mapped file, which is the Yr/dims/T layout CNMF expects. The source is
+    read once sequentially in chunks of frames, and each chunk is written to
+    every piece that does not exist yet or is older than the source.
+    :param fname: The path of the memory mapped file, such as the file saved
+        by motion correction.
+    :param proc_slices: A list of rectangular slices of each frame.
+    :param base_names: The beginning of the file name of each piece.
+    :param chunk_frames: The number of frames read from the source at once.
+    :param overwrite: Whether to write pieces whose files already exist and
+        are no older than the source.
+    :return: A list of file names, one for each piece.
+    """
+
+    images = memmap_piece(fname)
+    frames = images.shape[0]
+    source_time = os.path.getmtime(fname)
+
+    # Create an empty memory mapped file for each piece that must be written, including pieces saved before
+    # the source was last written (e.g. by running motion correction again)
+    fnames, slices, pieces = [], [], []
+    for proc_slice, base_name in zip(proc_slices, base_names):
+        dims = images[0, proc_slice[0], proc_slice[1]].shape
+        fnames.append(memmap_filename(base_name, dims, frames, order='C'))
+        if overwrite or not os.path.exists(fnames[-1]) or os.path.getmtime(fnames[-1]) < source_time:
+            slices.append(proc_slice)
+            pieces.append(np.memmap(fnames[-1], mode='w+', dtype=np.float32, shape=(int(np.prod(dims)), frames),
+                                    order='C'))
+
+    # Skip reading the source if every piece is up to date
+    if not pieces:
+        return fnames
+
+    # Read chunks of whole frames and write the pixels of each piece in the order CaImAn uses
+    for start in range(0, frames, chunk_frames):
+        chunk = np.asarray(images[start:start + chunk_frames])
+        for proc_slice, piece in zip(slices, pieces):
+            block = chunk[:, proc_slice[0], proc_slice[1]]
+            piece[:, start:start + chunk.shape[0]] = np.reshape(block, (chunk.shape[0], -1), order='F').T
+
+    # Write everything to disk
+    for piece in pieces:
+        piece.flush()
+
+    return fnames
@@ -2,7 +2,10 @@ import numpy as np
 
 import re
 
+from src.profiling import profile
 
+
+@profile
 def add_frames_to_datetime(time_start: np.datetime64, frames: int, fr: float) -> np.datetime64:
     """
     Return the time after adding the specified number of frames to the start
@@ -21,6 +24,7 @@ def add_frames_to_datetime(time_start: np.datetime64, frames: int, fr: float) ->
     return time_start + time_elapsed
 
 
+@profile
 def datetime_to_frame(time_curr: np.datetime64, time_start: np.datetime64, frame_start: int, fr: float) -> np.float64:
     """
     Convert a time to a frame number using a starting time and starting frame as reference.
@@ -38,6 +42,7 @@ def datetime_to_frame(time_curr: np.datetime64, time_start: np.datetime64, frame
     return frame_start + time_elapsed * fr
 
 
+@profile
 def image_desc_to_datetime(image_desc: str) -> np.datetime64:
     """
     Extract time information from an image description of a TIFF file frame.
@@ -58,6 +63,7 @@ def image_desc_to_datetime(image_desc: str) -> np.datetime64:
     return time_start + time_change
 
 
+@profile
 def timestamp_to_datetime(timestamp: np.ndarray) -> np.datetime64:
     """
     Convert a timestamp into a np.datetime64 rounded to the nearest
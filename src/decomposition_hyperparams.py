@@ -7,7 +7,7 @@ class Hyperparams:
     name:
         The main name of the data.
     path:
-        A path to the data array.
+        A path to the tensor store saved by tensor creation.
     n_components:
         The number(s) of components to find.
     rep:
@@ -18,6 +18,9 @@ class Hyperparams:
         Names of events used for alignment.
     events_time:
         The indices where events occurred.
+    dtype:
+        The name of the floating-point data type used for decompositions
+        (e.g. 'float32').
     """
 
     # Name and location
@@ -35,6 +38,9 @@ class Hyperparams:
     events_name: list[str]
     events_time: list[int]
 
+    # Precision
+    dtype: str
+
     def __init__(self, name: str) -> None:
         """
         Initialize a new Hyperparams object with the given name.
@@ -48,6 +54,7 @@ class Hyperparams:
         self.methods = []
         self.events_name = []
         self.events_time = []
+        self.dtype = 'float64'
 
     def set_path(self, path: str) -> None:
         """
@@ -86,3 +93,12 @@ class Hyperparams:
 
         self.events_name = events_name
         self.events_time = events_time
+
+    def set_precision(self, dtype: str) -> None:
+        """
+        Set the floating-point data type used for decompositions.
+        Accumulations that need more precision still use float64 internally.
+        :param dtype: The name of the data type (e.g. 'float32').
+        """
+
+        self.dtype = dtype
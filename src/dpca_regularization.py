@@ -0,0 +1,228 @@
+import numpy as np
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import combinations
+from numbers import Integral
+import os
+from typing import Optional, Union
+
+from src.profiling import profile
+from src.tensor import centered_trial_average
+
+
+@profile
+def marginalize(data: np.ndarray, labels: str, join: Optional[dict[str, list[str]]] = None) -> dict[str, np.ndarray]:
+    """
+    Split centered trial averages into marginalizations, one for each
+    combination of condition labels.
+    :param data: An array of centered trial averages with neurons along the
+        first axis and one axis for each label.
+    :param labels: A string with one character labelling each condition axis
+        (e.g. 'st' for stimulus and time).
+    :param join: A dictionary mapping a new key to a list of marginalization
+        keys to be summed together (e.g. {'s': ['s', 'st']}).
+    :return: A dictionary mapping each marginalization key to an array of
+        shape (neurons, conditions), where conditions is the product of the
+        sizes of all condition axes.
+    """
+
+    # Find the number of neurons and condition axes
+    neurons = data.shape[0]
+    n_labels = len(labels)
+
+    # Compute marginalizations from the smallest to largest subsets of labels
+    margs = {}
+    for size in range(1, n_labels + 1):
+        for subset in combinations(range(n_labels), size):
+
+            # Average over all axes not in the subset
+            axes = tuple(1 + i for i in range(n_labels) if i not in subset)
+            marg = np.mean(data, axis=axes, keepdims=True)
+
+            # Subtract all marginalizations of strictly smaller subsets
+            for smaller, smaller_marg in margs.items():
+                if set(smaller) < set(subset):
+                    marg = marg - smaller_marg
+            margs[subset] = marg
+
+    # Broadcast each marginalization to the full shape and collapse the condition axes
+    margs = {''.join(labels[i] for i in subset): np.broadcast_to(marg, data.shape).reshape((neurons, -1))
+             for subset, marg in margs.items()}
+
+    # Join marginalizations together if specified
+    if join is not None:
+        for key, keys_joined in join.items():
+            joined = sum(margs.pop(key_joined) for key_joined in keys_joined)
+            margs[key] = joined
+
+    return margs
+
+
+def _prepare_fold(train: np.ndarray, test: np.ndarray, labels: str, join: Optional[dict[str, list[str]]]) -> dict:
+    """
+    Precompute everything about a train/test fold that does not depend on the
+    regularization parameter.
+    :param train: Centered trial averages of the training trials.
+    :param test: Centered trial averages of the test trials.
+    :param labels: A string labelling each condition axis.
+    :param join: A dictionary of marginalizations to join.
+    :return: A dictionary with the singular values of the training data, the
+        training marginalizations and test data projected onto its singular
+        vectors, the test marginalizations, and the variances used for scaling.
+    """
+
+    # Marginalize the training and test data
+    margs_train = marginalize(train, labels, join)
+    margs_test = marginalize(test, labels, join)
+    x_train = train.reshape((train.shape[0], -1))
+    x_test = test.reshape((test.shape[0], -1))
+
+    # Decompose the training data once
+    p, s, qt = np.linalg.svd(x_train, full_matrices=False)
+
+    return {
+        's': s,
+        'margs_train': {key: marg @ qt.T for key, marg in margs_train.items()},
+        'margs_test': margs_test,
+        'test_proj': p.T @ x_test,
+        'var_train': np.sum(x_train ** 2),
+        'var_test': np.sum(x_test ** 2)
+    }
+
+
+def _evaluate_fold(fold: dict, lambdas: np.ndarray, n_components: dict[str, int]) -> np.ndarray:
+    """
+    Compute the residual variance over total test variance of a prepared fold
+    for each regularization parameter. The regularization matches the dPCA
+    package, which appends mu * I to the data with mu = lambda * sum(X**2),
+    so the ridge is mu**2 and the encoder is fit to the augmented data.
+    :param fold: A fold prepared by _prepare_fold.
+    :param lambdas: A 1-D array of regularization parameters as passed to
+        dPCA.dPCA(regularizer=...).
+    :param n_components: The number of components for each marginalization.
+    :return: A 1-D array of scores, one for each regularization parameter.
+    """
+
+    s = fold['s']
+    scores = np.zeros(lambdas.size)
+    for i, lam in enumerate(lambdas):
+
+        # Shrink the singular values according to the regularization parameter, where the augmented data
+        # [C @ X, mu * C] has the same left singular vectors as the marginalization scaled by shrink_fit
+        mu = lam * fold['var_train']
+        shrink_fit = s / np.sqrt(s ** 2 + mu ** 2)
+        shrink_decode = s / (s ** 2 + mu ** 2)
+
+        # Fit the encoder and decoder of each marginalization and reconstruct the test data
+        for key, marg_proj in fold['margs_train'].items():
+            encoder = np.linalg.svd(marg_proj * shrink_fit, full_matrices=False)[0][:, :n_components[key]]
+            decoded = encoder.T @ (marg_proj * shrink_decode) @ fold['test_proj']
+            scores[i] += np.sum((fold['margs_test'][key] - encoder @ decoded) ** 2)
+
+    return scores / fold['var_test']
+
+
+def _split_trials(n_trials: int, n_splits: int, seed: Optional[int]) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Randomly split trials into train/test folds.
+    :param n_trials: The number of trials.
+    :param n_splits: The number of folds.
+    :param seed: A seed for shuffling trials.
+    :return: A list of tuples containing the training and test trial indices
+        of each fold, respectively.
+    """
+
+    # Raise an error if some fold would have no training or test trials
+    if not 2 <= n_splits <= n_trials:
+        raise ValueError("The number of splits must be at least 2 and at most the number of trials.")
+
+    # Shuffle the trials and divide them into folds
+    order = np.random.default_rng(seed).permutation(n_trials)
+    return [(np.sort(np.setdiff1d(order, test)), np.sort(test)) for test in np.array_split(order, n_splits)]
+
+
+@profile
+def regularization_sweep(data: np.ndarray, labels: str, lambdas: Optional[np.ndarray] = None,
+                         n_components: Union[int, dict[str, int]] = 3, join: Optional[dict[str, list[str]]] = None,
+                         n_splits: int = 5, seed: Optional[int] = None, n_processes: Optional[int] = None) -> \
+        tuple[np.ndarray, np.ndarray]:
+    """
+    Cross-validate the regularization parameter of dPCA. For each fold, the
+    centered trial averages of the training and test trials are marginalized
+    and the training data is decomposed once, and the results are reused for
+    every regularization parameter.
+    :param data: An array of data collected from all trials, with trials along
+        the first axis, neurons along the second axis, and one axis for each
+        label. If there is only one stimulus, a stimulus axis of size one must
+        still be present (e.g. from np.expand_dims(tensor, axis=2)).
+    :param labels: A string labelling each condition axis (e.g. 'st').
+    :param lambdas: A 1-D array of regularization parameters on the same
+        scale as dPCA.dPCA(regularizer=...). If None, the 45 values searched
+        by regularizer='auto' are used.
+    :param n_components: The number of components for each marginalization.
+        This can be a single integer or a dictionary mapping each
+        marginalization key to an integer.
+    :param join: A dictionary of marginalizations to join (e.g.
+        {'s': ['s', 'st']}).
+    :param n_splits: The number of train/test folds of trials.
+    :param seed: A seed for shuffling trials into folds.
+    :param n_processes: The number of worker processes. If None, the number of
+        CPUs is used. If 1, everything runs in the current process.
+    :return: A tuple containing the array of regularization parameters and a
+        (n_splits, lambdas) array of residual variance over total test
+        variance, respectively.
+    """
+
+    # Use the default grid of regularization parameters if none is given
+    if lambdas is None:
+        lambdas = np.logspace(0, 45, num=45, base=1.4, endpoint=False) * 1e-7
+    lambdas = np.asarray(lambdas, dtype=np.float64)
+
+    # Compute centered trial averages of the training and test trials of each fold
+    folds = _split_trials(data.shape[0], n_splits, seed)
+    trains = [centered_trial_average(data[train], trial_axis=0, neuron_axis=1) for train, _ in folds]
+    tests = [centered_trial_average(data[test], trial_axis=0, neuron_axis=1) for _, test in folds]
+
+    # Use the same number of components for every marginalization if a single integer is given
+    if isinstance(n_components, Integral):
+        n_components = {key: n_components for key in marginalize(np.zeros((1,) * (len(labels) + 1)), labels, join)}
+
+    # Run in the current process if only one process is requested
+    if n_processes == 1:
+        prepared = [_prepare_fold(train, test, labels, join) for train, test in zip(trains, tests)]
+        return lambdas, np.array([_evaluate_fold(fold, lambdas, n_components) for fold in prepared])
+
+    # Run folds and chunks of the regularization parameters on a process pool otherwise
+    n_processes = os.cpu_count() if n_processes is None else n_processes
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+        return lambdas, _parallel_sweep(executor, trains, tests, labels, join, lambdas, n_components, n_processes)
+
+
+def _parallel_sweep(executor: Executor, trains: list[np.ndarray], tests: list[np.ndarray], labels: str,
+                    join: Optional[dict[str, list[str]]], lambdas: np.ndarray, n_components: dict[str, int],
+                    n_processes: int) -> np.ndarray:
+    """
+    Prepare folds and evaluate chunks of regularization parameters on an
+    executor.
+    :param executor: The executor to submit tasks to.
+    :param trains: Centered trial averages of the training trials of each fold.
+    :param tests: Centered trial averages of the test trials of each fold.
+    :param labels: A string labelling each condition axis.
+    :param join: A dictionary of marginalizations to join.
+    :param lambdas: A 1-D array of regularization parameters.
+    :param n_components: The number of components for each marginalization.
+    :param n_processes: The number of worker processes.
+    :return: A (folds, lambdas) array of scores.
+    """
+
+    # Prepare every fold once
+    n_folds = len(trains)
+    prepared = list(executor.map(_prepare_fold, trains, tests, [labels] * n_folds, [join] * n_folds))
+
+    # Split the regularization parameters so that every worker has a task
+    n_chunks = min(lambdas.size, -(-n_processes // n_folds))
+    chunks = np.array_split(lambdas, n_chunks)
+
+    # Evaluate every chunk of every fold
+    futures = [[executor.submit(_evaluate_fold, fold, chunk, n_components) for chunk in chunks] for fold in prepared]
+    return np.array([np.concatenate([future.result() for future in row]) for row in futures])
@@ -0,0 +1,169 @@
+import numpy as np
+
+from typing import Iterator, Optional
+
+from src.profiling import profile
+
+
+def _trial_chunks(tensor: np.ndarray, chunk_size: Optional[int], dtype: Optional[np.dtype]) -> \
+        Iterator[tuple[slice, np.ndarray]]:
+    """
+    Iterate over blocks of consecutive trials in the tensor. Only one block is
+    read into memory at a time, so memory-mapped tensors are supported.
+    :param tensor: An array of data with trials along the first axis.
+    :param chunk_size: The number of trials in each block. If None, all trials
+        are used in a single block.
+    :param dtype: The data type to cast each block to. If None, the data type
+        of the tensor is kept.
+    :return: An iterator of tuples containing the slice of trials and the
+        block of data, respectively.
+    """
+
+    # Use a single block if no chunk size is given
+    trials = tensor.shape[0]
+    if chunk_size is None:
+        chunk_size = max(trials, 1)
+
+    # Read each block of trials
+    for start in range(0, trials, chunk_size):
+        trial_slice = slice(start, min(start + chunk_size, trials))
+        yield trial_slice, np.asarray(tensor[trial_slice], dtype=dtype)
+
+
+def _block_scores(block: np.ndarray, neuron_factors: np.ndarray, time_factors: np.ndarray) -> np.ndarray:
+    """
+    Compute the component scores of a block of trials.
+    :param block: A (trials, neurons, time) array of data.
+    :param neuron_factors: A (neurons, rank) array of neuron factors.
+    :param time_factors: A (time, rank) array of time factors.
+    :return: A (trials, rank) array of component scores.
+    """
+
+    # Contract the time axis with a single matrix product and then the neuron axis
+    trials, neurons, times = block.shape
+    projected = (block.reshape((trials * neurons, times)) @ time_factors).reshape((trials, neurons, -1))
+    return np.einsum('knr,nr->kr', projected, neuron_factors)
+
+
+@profile
+def project_factors(tensor: np.ndarray, neuron_factors: np.ndarray, chunk_size: Optional[int] = None,
+                    dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Project the neuron dimension of each trial onto each neuron factor. This
+    gives the time course of every component within every trial.
+    :param tensor: A (trials, neurons, time) array of data. This may be a
+        memory-mapped array (e.g. from np.load with mmap_mode='r').
+    :param neuron_factors: A (neurons, rank) array of neuron factors.
+    :param chunk_size: The number of trials to process at once. If None, all
+        trials are processed at once.
+    :param dtype: The data type used for computation (e.g. np.float32). If
+        None, the data type of the tensor is used.
+    :return: A (rank, trials, time) array of time factors within trials.
+    """
+
+    # Cast the factors once to the data type used for computation
+    dtype = np.result_type(tensor.dtype, neuron_factors.dtype) if dtype is None else np.dtype(dtype)
+    neuron_factors = np.asarray(neuron_factors, dtype=dtype)
+
+    # Initialize an array to hold the projections
+    projections = np.empty((neuron_factors.shape[1], tensor.shape[0], tensor.shape[2]), dtype=dtype)
+
+    # Contract the neuron axis of each block of trials with all factors at once
+    for trial_slice, block in _trial_chunks(tensor, chunk_size, dtype):
+        projections[:, trial_slice] = np.einsum('nr,knt->rkt', neuron_factors, block, optimize=True)
+
+    return projections
+
+
+@profile
+def trial_scores(tensor: np.ndarray, neuron_factors: np.ndarray, time_factors: np.ndarray,
+                 chunk_size: Optional[int] = None, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Compute the score of each component in each trial, which is the inner
+    product of the trial with the outer product of the component's neuron and
+    time factors.
+    :param tensor: A (trials, neurons, time) array of data. This may be a
+        memory-mapped array.
+    :param neuron_factors: A (neurons, rank) array of neuron factors.
+    :param time_factors: A (time, rank) array of time factors.
+    :param chunk_size: The number of trials to process at once. If None, all
+        trials are processed at once.
+    :param dtype: The data type used for computation. If None, the data type
+        of the tensor is used.
+    :return: A (trials, rank) array of component scores.
+    """
+
+    # Cast the factors once to the data type used for computation
+    dtype = np.result_type(tensor.dtype, neuron_factors.dtype) if dtype is None else np.dtype(dtype)
+    neuron_factors = np.asarray(neuron_factors, dtype=dtype)
+    time_factors = np.asarray(time_factors, dtype=dtype)
+
+    # Initialize an array to hold the scores
+    scores = np.empty((tensor.shape[0], neuron_factors.shape[1]), dtype=dtype)
+
+    # Score each block of trials
+    for trial_slice, block in _trial_chunks(tensor, chunk_size, dtype):
+        scores[trial_slice] = _block_scores(block, neuron_factors, time_factors)
+
+    return scores
+
+
+@profile
+def trial_reconstruction_error(tensor: np.ndarray, factors: list[np.ndarray], chunk_size: Optional[int] = None,
+                               dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Compute the relative reconstruction error of each trial given the factors
+    of a CP decomposition. The reconstruction itself is never formed; the
+    error is expanded into norms and component scores instead.
+    :param tensor: A (trials, neurons, time) array of data. This may be a
+        memory-mapped array.
+    :param factors: A list of the (trials, rank), (neurons, rank), and
+        (time, rank) factor matrices, in that order. Any component weights
+        must already be absorbed into the factors (as in tensortools).
+    :param chunk_size: The number of trials to process at once. If None, all
+        trials are processed at once.
+    :param dtype: The data type used for computing scores. If None, the data
+        type of the tensor is used. Norms are always accumulated in float64.
+    :return: A 1-D array containing the relative error of each trial.
+    """
+
+    # Cast the factors to the data type used for computing scores
+    dtype = np.result_type(tensor.dtype, *factors) if dtype is None else np.dtype(dtype)
+    neuron_factors, time_factors = np.asarray(factors[1], dtype=dtype), np.asarray(factors[2], dtype=dtype)
+
+    # Find the squared norm of each trial and its scores in a single pass over the data
+    norms_sq = np.empty(tensor.shape[0])
+    scores = np.empty((tensor.shape[0], neuron_factors.shape[1]))
+    for trial_slice, block in _trial_chunks(tensor, chunk_size, dtype):
+        norms_sq[trial_slice] = np.einsum('knt,knt->k', block, block, dtype=np.float64)
+        scores[trial_slice] = _block_scores(block, neuron_factors, time_factors)
+
+    # Find the inner product of each trial with its reconstruction
+    trial_factors, neuron_factors, time_factors = [np.asarray(factor, dtype=np.float64) for factor in factors]
+    inner = np.sum(trial_factors * scores, axis=1)
+
+    # Find the squared norm of each reconstruction using the Gram matrices of the factors
+    gram = (neuron_factors.T @ neuron_factors) * (time_factors.T @ time_factors)
+    recon_sq = np.einsum('kr,rs,ks->k', trial_factors, gram, trial_factors)
+
+    # Combine the terms, clipping negative values caused by rounding
+    error_sq = np.maximum(norms_sq - 2 * inner + recon_sq, 0)
+    return np.sqrt(error_sq / norms_sq)
+
+
+@profile
+def factor_similarity(factors_a: np.ndarray, factors_b: np.ndarray) -> np.ndarray:
+    """
+    Compute the cosine similarity between every pair of components from two
+    factor matrices (e.g. time factors from two sessions).
+    :param factors_a: A (length, rank_a) array of factors.
+    :param factors_b: A (length, rank_b) array of factors.
+    :return: A (rank_a, rank_b) array of cosine similarities.
+    """
+
+    # Normalize each component to unit length
+    unit_a = factors_a / np.linalg.norm(factors_a, axis=0, keepdims=True)
+    unit_b = factors_b / np.linalg.norm(factors_b, axis=0, keepdims=True)
+
+    # Compute all inner products with a single matrix product
+    return unit_a.T @ unit_b
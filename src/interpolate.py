@@ -1,11 +1,14 @@
 import numpy as np
-from scipy.interpolate import interp1d
+
+from typing import Optional
 
 from src.datetime import datetime_to_frame
+from src.profiling import profile
 
 
+@profile
 def interpolate(data: np.ndarray, interval_n: int, time_start: np.datetime64, time_end: np.datetime64,
-                frame_start: int, frame_end: int, image_fr: float) -> np.ndarray:
+                frame_start: int, frame_end: int, image_fr: float, dtype: Optional[np.dtype] = None) -> np.ndarray:
     """
     Perform linear interpolation on part of the data.
     :param data: The entire array of data.
@@ -15,6 +18,8 @@ def interpolate(data: np.ndarray, interval_n: int, time_start: np.datetime64, ti
     :param frame_start: The index of the first frame in the interval.
     :param frame_end: The index of the last frame in the interval.
     :param image_fr: The frame rate of imaging.
+    :param dtype: The data type of the interpolated data. If None, the data
+        type returned by SciPy (float64) is kept.
     :return: An array containing interpolated data for the specified interval.
     """
 
@@ -31,17 +36,20 @@ def interpolate(data: np.ndarray, interval_n: int, time_start: np.datetime64, ti
     # Convert the times into frames
     frames_interpol = datetime_to_frame(times_interpol, time_start, frame_start, image_fr)
 
-    # Create a function to interpolate the time series
+    # Create a function to interpolate the time series (SciPy is only imported when needed)
+    from scipy.interpolate import interp1d
     x = np.arange(frame_start, frame_end + 1)
     y = data[:, x]
     f = interp1d(x, y, axis=1)
 
     # Return the interpolated values
-    return f(frames_interpol)
+    interpol = f(frames_interpol)
+    return interpol if dtype is None else interpol.astype(dtype, copy=False)
 
 
+@profile
 def stitch(data: np.ndarray, time_elapsed: list[int, int], frame_start: int,
-           frame_end: int, image_fr: float) -> tuple[np.ndarray, np.ndarray]:
+           frame_end: int, image_fr: float, dtype: Optional[np.dtype] = None) -> tuple[np.ndarray, np.ndarray]:
     """
     Concatenate frames from the beginning and end of a certain interval. The
     frames at the end of the interval are translated such that the last frame
@@ -53,6 +61,8 @@ def stitch(data: np.ndarray, time_elapsed: list[int, int], frame_start: int,
     :param frame_start: The index of the first frame in the interval.
     :param frame_end: The index of the last frame in the interval.
     :param image_fr: The frame rate of imaging.
+    :param dtype: The data type of the returned arrays. If None, the data type
+        of the data is kept.
     :return: A tuple containing an array of frames from the beginning and end
         of the interval joined together and an array of distances used for
         translation, respectively.
@@ -65,23 +75,29 @@ def stitch(data: np.ndarray, time_elapsed: list[int, int], frame_start: int,
     # Calculate the distance to translate frames near the end
     distance = data[:, frame_start + n_frames_from_start - 1] - data[:, frame_end - n_frames_to_end + 1]
     distance = np.expand_dims(distance, axis=1)
+    if dtype is not None:
+        distance = distance.astype(dtype, copy=False)
 
     # Get frames from the start and translate frames from the end
     interval_start = data[:, frame_start:frame_start + n_frames_from_start]
     interval_end = data[:, frame_end - n_frames_to_end + 1:frame_end + 1] + distance
 
     # Concatenate frames from the beginning and end of the interval
-    return np.concatenate((interval_start, interval_end), axis=1), distance
+    return np.concatenate((interval_start, interval_end), axis=1, dtype=dtype), distance
 
 
-def truncate(data: np.ndarray, interval_n: int, frame_start: int) -> np.ndarray:
+@profile
+def truncate(data: np.ndarray, interval_n: int, frame_start: int, dtype: Optional[np.dtype] = None) -> np.ndarray:
     """
     Truncate data to the specified number of frames after the starting frame.
     :param data: The entire array of data.
     :param interval_n: The number of frames to keep in the interval.
     :param frame_start: The index of the first frame in the interval.
+    :param dtype: The data type of the truncated data. If None, the data type
+        of the data is kept.
     :return: An array containing truncated data.
     """
 
     # Truncate the data to the specified number of frames
-    return data[:, frame_start:frame_start + interval_n]
+    truncated = data[:, frame_start:frame_start + interval_n]
+    return truncated if dtype is None else truncated.astype(dtype, copy=False)
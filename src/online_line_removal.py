@@ -0,0 +1,212 @@
+import numpy as np
+
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+from src.caiman_preprocessing_hyperparams import Hyperparams
+from src.profiling import profile
+
+
+class OnlineLineRemover:
+    """
+    Removes line artifacts and blank frames from frames arriving one at a
+    time, using the same thresholds and rules as find_local_max,
+    replace_rows, and blank removal. Frames are kept in a ring buffer until
+    no later local maximum can affect them, so memory use is constant and
+    each frame is emitted a fixed number of frames after it arrives.
+
+    Away from both ends of the movie, the emitted frames match the offline
+    result. Within the radii of either end, local maxima are only compared
+    with frames that exist and rows are only replaced in frames that exist,
+    whereas the offline functions wrap around or fail there.
+
+    === Attributes ===
+
+    hyp:
+        The hyperparameters containing the line removal thresholds and, if
+        line removal by proxy is used, the proxy slices.
+    latency:
+        The number of frames that must arrive after a frame before it can be
+        emitted.
+    local_max:
+        A list of indices to all local maxima confirmed so far.
+    """
+
+    # Hyperparameters
+    hyp: Hyperparams
+
+    # Stream state
+    latency: int
+    local_max: list[int]
+
+    def __init__(self, hyp: Hyperparams) -> None:
+        """
+        Initialize a new OnlineLineRemover with the given hyperparameters.
+        :param hyp: The hyperparameters of the data.
+        """
+
+        self.hyp = hyp
+
+        # A local maximum is confirmed local_max_rad frames after it arrives and corrected once its
+        # whole correction radius has arrived, and it can change frames correction_rad frames before it
+        self.latency = hyp.correction_rad + max(hyp.local_max_rad, hyp.correction_rad)
+        self.local_max = []
+
+        # Ring buffers of frames and their mean row fluorescences, allocated when the first frame arrives
+        self._size = self.latency + 1
+        self._frames = None
+        self._row_means = None
+
+        # Ring buffer of mean fluorescences, which must also cover the window of each potential local maximum
+        self._means_size = max(self._size, 2 * hyp.local_max_rad + 1)
+        self._means = np.empty(self._means_size)
+
+        # Confirmed local maxima that have not been corrected yet and the number of frames so far
+        self._pending = deque()
+        self._count = 0
+
+    @profile
+    def push(self, frame: np.ndarray) -> list[tuple[int, np.ndarray]]:
+        """
+        Add the next frame of the movie.
+        :param frame: A 2-D frame.
+        :return: A list of tuples containing the index and the corrected frame
+            of every non-blank frame that can no longer change, in order.
+        """
+
+        # Start a new movie after a flush
+        index = self._count
+        if index == 0:
+            self.local_max = []
+        self._count += 1
+        self._store(index, frame)
+
+        # Check the frame whose window of mean fluorescences is now complete
+        if index >= self.hyp.local_max_rad:
+            self._check_local_max(index - self.hyp.local_max_rad, index)
+
+        # Correct rows around every confirmed local maximum whose correction radius has arrived
+        while self._pending and self._pending[0] + self.hyp.correction_rad <= index:
+            self._correct(self._pending.popleft(), index)
+
+        # Emit the frame that no local maximum can affect anymore
+        return self._emit(range(index - self.latency, index - self.latency + 1))
+
+    @profile
+    def flush(self) -> list[tuple[int, np.ndarray]]:
+        """
+        End the stream and emit every remaining frame. The remover can then
+        be used for a new movie.
+        :return: A list of tuples containing the index and the corrected frame
+            of every remaining non-blank frame, in order.
+        """
+
+        last = self._count - 1
+
+        # Check the frames at the end of the movie against the frames that exist
+        for index in range(max(self._count - self.hyp.local_max_rad, 0), self._count):
+            self._check_local_max(index, last)
+
+        # Correct rows around the remaining local maxima within the frames that exist
+        while self._pending:
+            self._correct(self._pending.popleft(), last)
+
+        # Emit every frame that is still buffered and start over
+        emitted = self._emit(range(max(self._count - self.latency, 0), self._count))
+        self._frames, self._row_means = None, None
+        self._pending.clear()
+        self._count = 0
+        return emitted
+
+    def _store(self, index: int, frame: np.ndarray) -> None:
+        """
+        Store a frame and its mean fluorescences in the ring buffers.
+        :param index: The index of the frame.
+        :param frame: The frame.
+        """
+
+        # Copy the frame as floats like cm.load does, so that integer frames can hold np.nan, and remove
+        # all rectangular slices if line removal by proxy is used
+        frame_dgn = np.array(frame, dtype=np.result_type(frame.dtype, np.float32))
+        if self.hyp.lr_proxy:
+            for rectangle in self.hyp.proxy_slices:
+                frame_dgn[rectangle[0], rectangle[1]] = np.nan
+
+        # Find the mean fluorescence of the frame and of each row
+        row_means = np.nanmean(frame_dgn, axis=1)
+        if self._frames is None:
+            self._frames = np.empty((self._size,) + frame.shape, dtype=frame.dtype)
+            self._row_means = np.empty((self._size,) + row_means.shape, dtype=row_means.dtype)
+        self._frames[index % self._size] = frame
+        self._row_means[index % self._size] = row_means
+        self._means[index % self._means_size] = np.nanmean(frame_dgn, axis=(0, 1))
+
+    def _check_local_max(self, index: int, last: int) -> None:
+        """
+        Confirm whether a frame is a local maximum using the same comparisons
+        as find_local_max.
+        :param index: The index of the frame.
+        :param last: The index of the newest frame.
+        """
+
+        value = self._means[index % self._means_size]
+        window = np.arange(max(index - self.hyp.local_max_rad, 0), min(index + self.hyp.local_max_rad, last) + 1)
+        if not value < self.hyp.local_max_thr and not np.any(value < self._means[window % self._means_size]):
+            self.local_max.append(index)
+            self._pending.append(index)
+
+    def _correct(self, point: int, last: int) -> None:
+        """
+        Replace affected rows around a local maximum in the buffered frames
+        using the same rules as replace_rows.
+        :param point: The index of the local maximum.
+        :param last: The index of the newest frame.
+        """
+
+        # Get the range of frames to potentially correct
+        lb, ub = max(point - self.hyp.correction_rad, 0), min(point + self.hyp.correction_rad, last) + 1
+
+        # Store the most recent pixel rows that are correct
+        last_known_good_config = np.copy(self._frames[lb % self._size])
+
+        for i in range(lb, ub):
+
+            # Check if the frame is the correct color channel
+            if not self._means[i % self._means_size] > self.hyp.channel_thr:
+                continue
+
+            # Replace affected rows and save the others
+            frame = self._frames[i % self._size]
+            affected = self._row_means[i % self._size] > self.hyp.correction_thr
+            frame[affected] = last_known_good_config[affected]
+            last_known_good_config[~affected] = frame[~affected]
+
+    def _emit(self, indices: range) -> list[tuple[int, np.ndarray]]:
+        """
+        Copy the given buffered frames out, skipping blank frames.
+        :param indices: The indices of the frames.
+        :return: A list of tuples containing the index and a copy of each
+            non-blank frame.
+        """
+
+        return [(i, np.copy(self._frames[i % self._size])) for i in indices
+                if i >= 0 and self._means[i % self._means_size] > self.hyp.channel_thr]
+
+
+def remove_lines_online(frames: Iterable[np.ndarray], hyp: Hyperparams,
+                        remover: Optional[OnlineLineRemover] = None) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Remove line artifacts and blank frames from a stream of frames.
+    :param frames: An iterable of 2-D frames in order, such as the pages of a
+        TIFF file being decoded or frames being acquired.
+    :param hyp: The hyperparameters of the data.
+    :param remover: An OnlineLineRemover to use, e.g. to inspect its
+        local_max afterwards. If None, a new one is created.
+    :return: An iterator of tuples containing the index and the corrected
+        frame of every non-blank frame, in order.
+    """
+
+    remover = OnlineLineRemover(hyp) if remover is None else remover
+    for frame in frames:
+        yield from remover.push(frame)
+    yield from remover.flush()
@@ -0,0 +1,312 @@
+from contextlib import contextmanager
+import functools
+import os
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+
+# Environment variables read when the module is imported, so that worker processes inherit the settings
+ENV_ENABLED = 'SRC_PROFILE'
+ENV_DIR = 'SRC_PROFILE_DIR'
+ENV_MEMORY = 'SRC_PROFILE_MEMORY'
+
+# Fields of each record in the order they are written to reports
+FIELDS = ['name', 'kind', 'calls', 'wall_time', 'cpu_time', 'array_bytes', 'rss_growth', 'peak_traced']
+
+# Module state
+_enabled = os.environ.get(ENV_ENABLED, '') not in ('', '0')
+_memory = os.environ.get(ENV_MEMORY, '') not in ('', '0')
+_records = {}
+_lock = threading.Lock()
+_traced_stack = []
+_finalizer = None
+_started_tracing = False
+_after_fork_registered = False
+
+
+def enable(output_dir: Optional[str] = None, memory: bool = False) -> None:
+    """
+    Turn on profiling in this process and in any worker processes started
+    afterwards.
+    :param output_dir: A directory where every process writes its records as
+        JSON when it exits. If None, records are only kept in memory.
+    :param memory: Whether to trace Python memory allocations with tracemalloc.
+        This is accurate but slow.
+    """
+
+    global _enabled, _memory
+    _enabled = True
+    _memory = memory
+    os.environ[ENV_ENABLED] = '1'
+    os.environ[ENV_MEMORY] = '1' if memory else '0'
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        os.environ[ENV_DIR] = os.path.abspath(output_dir)
+        _register_dump()
+
+
+def disable() -> None:
+    """
+    Turn off profiling in this process and in any worker processes started
+    afterwards. Records collected so far are kept, and memory tracing is
+    stopped if profiling started it.
+    """
+
+    global _enabled, _started_tracing
+    _enabled = False
+    os.environ[ENV_ENABLED] = '0'
+    if _started_tracing:
+        import tracemalloc
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def is_enabled() -> bool:
+    """
+    Return whether profiling is turned on.
+    """
+
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Remove all records collected so far in this process.
+    """
+
+    with _lock:
+        _records.clear()
+
+
+def get_records() -> dict[str, dict]:
+    """
+    Return a copy of all records collected so far in this process.
+    :return: A dictionary mapping each name to its record.
+    """
+
+    with _lock:
+        return {name: dict(record) for name, record in _records.items()}
+
+
+def _rss() -> Optional[int]:
+    """
+    Return the current resident set size of this process in bytes, if
+    available.
+    """
+
+    # Linux reports the number of resident pages in the second field
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    # Other platforms need psutil
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _array_bytes(args: tuple, kwargs: dict) -> int:
+    """
+    Return the total size of all array arguments in bytes.
+    """
+
+    return sum(getattr(arg, 'nbytes', 0) for arg in list(args) + list(kwargs.values()))
+
+
+@contextmanager
+def _measure(name: str, kind: str, array_bytes: int) -> Iterator[None]:
+    """
+    Measure the enclosed code and add the measurements to the record of the
+    given name.
+    :param name: The name of the record.
+    :param kind: Either 'function' or 'stage'.
+    :param array_bytes: The total size of arrays passed to the code.
+    """
+
+    # Start tracing memory if needed and remember the peak of any enclosing measurement
+    global _started_tracing
+    traced = _memory
+    traced_start = 0
+    if traced:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        traced_start, traced_peak = tracemalloc.get_traced_memory()
+        if _traced_stack:
+            _traced_stack[-1] = max(_traced_stack[-1], traced_peak)
+        _traced_stack.append(traced_start)
+        tracemalloc.reset_peak()
+
+    rss_start = _rss()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        # Find the peak traced memory above the memory in use when the measurement started
+        peak_traced = None
+        if traced:
+            peak_traced = max(_traced_stack.pop(), tracemalloc.get_traced_memory()[1]) - traced_start
+
+        # Find how much the resident set grew, which excludes memory freed before the code finished
+        rss_end = _rss()
+        rss_growth = None if rss_start is None or rss_end is None else rss_end - rss_start
+
+        # Add the measurements to the record
+        with _lock:
+            record = _records.setdefault(name, {'name': name, 'kind': kind, 'calls': 0, 'wall_time': 0.0,
+                                                'cpu_time': 0.0, 'array_bytes': 0, 'rss_growth': None,
+                                                'peak_traced': None})
+            record['calls'] += 1
+            record['wall_time'] += wall_time
+            record['cpu_time'] += cpu_time
+            record['array_bytes'] += array_bytes
+            record['rss_growth'] = _max(record['rss_growth'], rss_growth)
+            record['peak_traced'] = _max(record['peak_traced'], peak_traced)
+
+
+def _max(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    """
+    Return the maximum of two values that may be None.
+    """
+
+    return b if a is None else a if b is None else max(a, b)
+
+
+def profile(func: Callable) -> Callable:
+    """
+    Decorate a function so that every call is recorded while profiling is
+    turned on. While profiling is off, the only overhead is a single check.
+    :param func: The function to decorate.
+    :return: The decorated function.
+    """
+
+    name = func.__module__ + '.' + func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _measure(name, 'function', _array_bytes(args, kwargs)):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Record the enclosed code as a pipeline stage while profiling is turned on.
+    :param name: The name of the stage.
+    """
+
+    if not _enabled:
+        yield
+        return
+    with _measure(name, 'stage', 0):
+        yield
+
+
+def write_report(path: str, records: Optional[dict[str, dict]] = None) -> None:
+    """
+    Write records to a JSON or CSV file depending on the file extension.
+    :param path: The path of the report ending with .json or .csv.
+    :param records: The records to write. If None, the records collected so
+        far in this process are used.
+    """
+
+    import csv
+    import json
+
+    records = get_records() if records is None else records
+    rows = sorted(records.values(), key=lambda record: record['wall_time'], reverse=True)
+
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as file:
+            json.dump(rows, file, indent=2)
+
+
+def merge_reports(directory: str) -> dict[str, dict]:
+    """
+    Merge the JSON reports written by all processes into a single set of
+    records. Times, calls, and array sizes are summed while RSS growth and
+    peaks are maximized.
+    :param directory: The directory passed to enable.
+    :return: A dictionary mapping each name to its merged record.
+    """
+
+    import glob
+    import json
+
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'profile_*.json'))):
+        with open(path) as file:
+            for row in json.load(file):
+                record = merged.setdefault(row['name'], dict(row, calls=0, wall_time=0.0, cpu_time=0.0,
+                                                             array_bytes=0, rss_growth=None, peak_traced=None))
+                for key in ['calls', 'wall_time', 'cpu_time', 'array_bytes']:
+                    record[key] += row[key]
+                for key in ['rss_growth', 'peak_traced']:
+                    record[key] = _max(record[key], row[key])
+    return merged
+
+
+def _dump() -> None:
+    """
+    Write the records of this process to the output directory, if any.
+    """
+
+    directory = os.environ.get(ENV_DIR)
+    if directory and _records:
+        write_report(os.path.join(directory, 'profile_{}.json'.format(os.getpid())))
+
+
+def _register_dump() -> None:
+    """
+    Make sure the records of this process are written when it exits. A
+    multiprocessing finalizer is used because worker processes skip atexit
+    handlers but still run these.
+    """
+
+    global _finalizer, _after_fork_registered
+    from multiprocessing import util
+    if _finalizer is None or not _finalizer.still_active():
+        _finalizer = util.Finalize(None, _dump, exitpriority=10)
+
+    # Worker processes clear all finalizers after forking, so register again afterwards
+    if not _after_fork_registered:
+        util.register_after_fork(_register_dump, lambda func: func() if _enabled and os.environ.get(ENV_DIR) else None)
+        _after_fork_registered = True
+
+
+def _after_fork() -> None:
+    """
+    Clear records inherited from the parent process and register the dump
+    again, since finalizers are tied to the process that created them.
+    """
+
+    global _finalizer
+    reset()
+    _traced_stack.clear()
+    _finalizer = None
+    if _enabled and os.environ.get(ENV_DIR):
+        _register_dump()
+
+
+# Register the dump in worker processes that import this module with profiling turned on
+if _enabled and os.environ.get(ENV_DIR):
+    _register_dump()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
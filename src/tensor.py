@@ -1,21 +1,34 @@
 import numpy as np
 
+from typing import Optional
 
-def centered_trial_average(data: np.ndarray, trial_axis: int, neuron_axis: int) -> np.ndarray:
+from src.profiling import profile
+
+
+@profile
+def centered_trial_average(data: np.ndarray, trial_axis: int, neuron_axis: int,
+                           dtype: Optional[np.dtype] = None) -> np.ndarray:
     """
     Compute the average of all trials in the data and return the centered
-    averages.
+    averages. Averages are always accumulated in float64.
     :param data: An array of data collected from all trials.
     :param trial_axis: The axis of trial data in the array.
     :param neuron_axis: The axis of neuron data in the array.
+    :param dtype: The data type of the centered averages. If None, the data
+        type of the data is kept for floating-point data and float64 is used
+        otherwise.
     :return: An array of centered trial averages.
     """
 
+    # Find the data type of the result
+    if dtype is None:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+
     # Find the number of neurons
     neurons = data.shape[neuron_axis]
 
     # Average the data over trials
-    trial_average = np.mean(data, trial_axis)
+    trial_average = np.mean(data, trial_axis, dtype=np.float64)
     if trial_axis < neuron_axis:
         neuron_axis -= 1
 
@@ -29,16 +42,48 @@ def centered_trial_average(data: np.ndarray, trial_axis: int, neuron_axis: int)
     shape[neuron_axis] = neurons
 
     # Center the data
-    return trial_average - np.mean(collapsed_trial_average, 1).reshape(shape)
+    centered = trial_average - np.mean(collapsed_trial_average, 1).reshape(shape)
+    return centered.astype(dtype, copy=False)
 
 
-def minmax(data: np.ndarray, axis: int) -> np.ndarray:
+@profile
+def minmax(data: np.ndarray, axis: int, dtype: Optional[np.dtype] = None) -> np.ndarray:
     """
     Perform min-max normalization on the data along the given axis.
     :param data: An array of data.
     :param axis: The axis to normalize.
+    :param dtype: The data type of the normalized data. If None, the data type
+        of the data is kept for floating-point data and float64 is used
+        otherwise.
     :return: A normalized array of data.
     """
+    if dtype is None:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
     maxima = np.max(data, axis=axis, keepdims=True)
     minima = np.min(data, axis=axis, keepdims=True)
-    return (data - minima) / (maxima - minima)
+    normalized = np.subtract(data, minima, dtype=dtype)
+    normalized /= np.subtract(maxima, minima, dtype=normalized.dtype)
+    return normalized
+
+
+@profile
+def zscore(data: np.ndarray, axis: int, ddof: int = 0, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Normalize the data by z-score along the given axis. The mean and standard
+    deviation are always accumulated in float64.
+    :param data: An array of data.
+    :param axis: The axis to normalize.
+    :param ddof: The delta degrees of freedom of the standard deviation. The
+        default of 0 matches scipy.stats.zscore.
+    :param dtype: The data type of the normalized data. If None, the data type
+        of the data is kept for floating-point data and float64 is used
+        otherwise.
+    :return: A normalized array of data.
+    """
+    if dtype is None:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+    mean = np.mean(data, axis=axis, keepdims=True, dtype=np.float64)
+    std = np.std(data, axis=axis, ddof=ddof, keepdims=True, dtype=np.float64)
+    normalized = np.subtract(data, mean, dtype=dtype)
+    normalized /= std.astype(normalized.dtype)
+    return normalized
@@ -50,6 +50,9 @@ class Hyperparams:
         alignment events occurred.
     align_opts:
         A list of options for aligning intervals between events.
+    dtype:
+        The name of the floating-point data type of the aligned time series
+        and the saved tensors (e.g. 'float32').
     """
 
     # Main name of the data
@@ -84,6 +87,9 @@ class Hyperparams:
     events_field: list[str]
     align_opts: list[tuple]
 
+    # Precision
+    dtype: str
+
     def __init__(self, name: str) -> None:
         """
         Initialize a new Hyperparams object with the given name.
@@ -108,6 +114,7 @@ class Hyperparams:
         self.heatmap_bound = 0
         self.events_field = []
         self.align_opts = []
+        self.dtype = 'float64'
 
     def set_data_paths(self, estimates: list[str]) -> None:
         """
@@ -212,3 +219,13 @@ class Hyperparams:
 
         self.events_field = events_field
         self.align_opts = align_opts
+
+    def set_precision(self, dtype: str) -> None:
+        """
+        Set the floating-point data type used for aligning time series and
+        creating tensors. Accumulations that need more precision still use
+        float64 internally.
+        :param dtype: The name of the data type (e.g. 'float32').
+        """
+
+        self.dtype = dtype
@@ -0,0 +1,329 @@
+import numpy as np
+
+import json
+import os
+import shutil
+from typing import Optional
+
+from src.profiling import profile
+
+
+# Version of the layout written to meta.json
+VERSION = 1
+
+# Name of the metadata file inside a store
+META = 'meta.json'
+
+
+def _chunk_path(path: str, normalization: str, i: int, j: int, compressed: bool) -> str:
+    """
+    Return the path of the chunk holding trial chunk i and neuron chunk j.
+    """
+
+    return os.path.join(path, normalization, '{}_{}.{}'.format(i, j, 'npz' if compressed else 'npy'))
+
+
+@profile
+def save_tensor(path: str, tensors: dict[str, np.ndarray], events_name: list[str], events_time: list[int],
+                keep: Optional[np.ndarray] = None, neurons: Optional[np.ndarray] = None,
+                clusters: Optional[np.ndarray] = None,
+                trials: Optional[list[int]] = None, trials_valid: Optional[list[bool]] = None,
+                chunks: tuple[int, int] = (10, 256), compressed: bool = False) -> None:
+    """
+    Save one or more normalizations of a (trials, neurons, time) tensor as a
+    directory of blocks chunked along trials and neurons, with metadata
+    describing the tensor.
+    :param path: The directory of the store. An existing store there is
+        replaced entirely.
+    :param tensors: A dictionary mapping the name of each normalization (e.g.
+        'zscore' and 'minmax') to a tensor. All tensors must have the same
+        shape and data type.
+    :param events_name: Names of events used for alignment.
+    :param events_time: The indices along the time axis where events occurred.
+    :param keep: A boolean mask over all components from source extraction
+        that is True for components kept as neurons.
+    :param neurons: The index of the component of each neuron in the tensor,
+        which differs from the order of keep if neurons were reordered (e.g.
+        by cluster).
+    :param clusters: The cluster label of each neuron in the tensor.
+    :param trials: The index of each trial of the tensor in the experiment.
+    :param trials_valid: Whether each trial of the tensor is valid. Invalid
+        trials hold a copy of the previous trial.
+    :param chunks: The number of trials and neurons in each block.
+    :param compressed: Whether to compress each block. Compressed blocks are
+        smaller but cannot be memory mapped.
+    """
+
+    # Raise an error if the tensors do not match
+    shapes = {tensor.shape for tensor in tensors.values()}
+    dtypes = {tensor.dtype for tensor in tensors.values()}
+    if len(shapes) != 1 or len(dtypes) != 1:
+        raise ValueError("All tensors must have the same shape and data type.")
+    shape, dtype = shapes.pop(), dtypes.pop()
+
+    # Remove the metadata of an existing store first so that a partially replaced store is never read, then
+    # remove all of its blocks
+    meta_path = os.path.join(path, META)
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            normalizations_old = json.load(file)['normalizations']
+        os.remove(meta_path)
+        for normalization in normalizations_old:
+            shutil.rmtree(os.path.join(path, normalization), ignore_errors=True)
+
+    # Raise an error instead of writing into a directory that is not a store, except for blocks left behind by
+    # an interrupted save
+    elif os.path.isdir(path) and not set(os.listdir(path)) <= set(tensors):
+        raise ValueError("The directory {} exists and is not a tensor store.".format(path))
+
+    # Write every block of every normalization
+    os.makedirs(path, exist_ok=True)
+    for normalization, tensor in tensors.items():
+        shutil.rmtree(os.path.join(path, normalization), ignore_errors=True)
+        os.makedirs(os.path.join(path, normalization))
+        for i in range(-(-shape[0] // chunks[0])):
+            for j in range(-(-shape[1] // chunks[1])):
+                block = np.ascontiguousarray(tensor[i * chunks[0]:(i + 1) * chunks[0],
+                                                    j * chunks[1]:(j + 1) * chunks[1]])
+                if compressed:
+                    np.savez_compressed(_chunk_path(path, normalization, i, j, True), block=block)
+                else:
+                    np.save(_chunk_path(path, normalization, i, j, False), block)
+
+    # Write the metadata last so that an interrupted save is never read
+    meta = {
+        'version': VERSION,
+        'shape': list(shape),
+        'dtype': dtype.str,
+        'chunks': list(chunks),
+        'compressed': compressed,
+        'normalizations': list(tensors),
+        'events_name': list(events_name),
+        'events_time': [int(time) for time in events_time],
+        'keep': None if keep is None else np.asarray(keep, dtype=bool).tolist(),
+        'neurons': None if neurons is None else [int(neuron) for neuron in neurons],
+        'clusters': None if clusters is None else np.asarray(clusters).tolist(),
+        'trials': None if trials is None else [int(trial) for trial in trials],
+        'trials_valid': None if trials_valid is None else [bool(valid) for valid in trials_valid]
+    }
+    with open(os.path.join(path, META), 'w') as file:
+        json.dump(meta, file, indent=2)
+
+
+class ChunkedTensor:
+    """
+    A read-only (trials, neurons, time) tensor saved by save_tensor. Indexing
+    only reads the blocks containing the selected trials and neurons, and
+    uncompressed blocks are memory mapped so only the selected rows are paged
+    in.
+
+    === Attributes ===
+
+    path:
+        The directory of the store.
+    normalization:
+        The name of the normalization.
+    shape:
+        The shape of the tensor.
+    dtype:
+        The data type of the tensor.
+    chunks:
+        The number of trials and neurons in each block.
+    compressed:
+        Whether blocks are compressed.
+    """
+
+    # Location
+    path: str
+    normalization: str
+
+    # Layout
+    shape: tuple[int, int, int]
+    dtype: np.dtype
+    chunks: tuple[int, int]
+    compressed: bool
+
+    def __init__(self, path: str, normalization: str, meta: dict) -> None:
+        """
+        Initialize a new ChunkedTensor from the metadata of its store.
+        :param path: The directory of the store.
+        :param normalization: The name of the normalization.
+        :param meta: The metadata of the store.
+        """
+
+        self.path = path
+        self.normalization = normalization
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.chunks = tuple(meta['chunks'])
+        self.compressed = meta['compressed']
+
+    @property
+    def ndim(self) -> int:
+        """
+        Return the number of dimensions of the tensor.
+        """
+
+        return len(self.shape)
+
+    def __len__(self) -> int:
+        """
+        Return the number of trials.
+        """
+
+        return self.shape[0]
+
+    def __array__(self, dtype: Optional[np.dtype] = None, copy: Optional[bool] = None) -> np.ndarray:
+        """
+        Read the entire tensor.
+        """
+
+        tensor = self[:]
+        return tensor if dtype is None else tensor.astype(dtype, copy=False)
+
+    def _block(self, i: int, j: int) -> np.ndarray:
+        """
+        Load the block holding trial chunk i and neuron chunk j.
+        """
+
+        fname = _chunk_path(self.path, self.normalization, i, j, self.compressed)
+        if self.compressed:
+            with np.load(fname) as file:
+                return file['block']
+        return np.load(fname, mmap_mode='r')
+
+    @profile
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Read part of the tensor. Integers, slices, and integer or boolean
+        arrays are supported along each axis, as with NumPy basic and
+        per-axis fancy indexing, and an ellipsis stands for every axis not
+        otherwise indexed. New axes (None) are not supported.
+        :param key: An index for up to three axes.
+        :return: A new array containing the selected part.
+        """
+
+        # Raise an error for new axes, which would otherwise be taken as an index of the next axis
+        key = key if isinstance(key, tuple) else (key,)
+        if any(index is None for index in key):
+            raise IndexError("New axes are not supported when reading a tensor.")
+
+        # Expand an ellipsis into full slices of the axes it stands for
+        ellipses = [i for i, index in enumerate(key) if index is Ellipsis]
+        if len(ellipses) > 1:
+            raise IndexError("An index can only have a single ellipsis.")
+        if ellipses:
+            key = key[:ellipses[0]] + (slice(None),) * (self.ndim - len(key) + 1) + key[ellipses[0] + 1:]
+
+        # Pad the key to one index per axis
+        if len(key) > self.ndim:
+            raise IndexError("Too many indices for a tensor with {} dimensions.".format(self.ndim))
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        # Find the selected trials and neurons, remembering which axes are dropped by integers
+        t_idx = np.arange(self.shape[0])[key[0]]
+        n_idx = np.arange(self.shape[1])[key[1]]
+        scalar = (np.ndim(t_idx) == 0, np.ndim(n_idx) == 0)
+        t_idx, n_idx = np.atleast_1d(t_idx), np.atleast_1d(n_idx)
+        times = np.empty(self.shape[2], dtype=bool)[key[2]].shape
+
+        # Copy the selected part of every block that contains any selected trial and neuron
+        result = np.empty((t_idx.size, n_idx.size) + times, dtype=self.dtype)
+        t_chunk, n_chunk = t_idx // self.chunks[0], n_idx // self.chunks[1]
+        for i in np.unique(t_chunk):
+            t_sel = np.flatnonzero(t_chunk == i)
+            for j in np.unique(n_chunk):
+                n_sel = np.flatnonzero(n_chunk == j)
+                # Select rows before times so that a memory mapped block only pages in the selected rows
+                rows = np.ix_(t_idx[t_sel] - i * self.chunks[0], n_idx[n_sel] - j * self.chunks[1])
+                result[np.ix_(t_sel, n_sel)] = self._block(i, j)[rows][:, :, key[2]]
+
+        # Drop the axes indexed by integers
+        return result[tuple(0 if dropped else slice(None) for dropped in scalar)]
+
+
+class TensorStore:
+    """
+    A lazily loaded store of tensors saved by save_tensor, one for each
+    normalization, together with their metadata.
+
+    === Attributes ===
+
+    path:
+        The directory of the store.
+    shape:
+        The shape of every tensor in the store.
+    normalizations:
+        Names of the normalizations in the store.
+    events_name:
+        Names of events used for alignment.
+    events_time:
+        The indices along the time axis where events occurred.
+    keep:
+        A boolean mask over all components from source extraction that is
+        True for components kept as neurons, or None if not saved.
+    neurons:
+        The index of the component of each neuron, or None if not saved.
+    clusters:
+        The cluster label of each neuron, or None if not saved.
+    trials:
+        The index of each trial in the experiment, or None if not saved.
+    trials_valid:
+        Whether each trial is valid, or None if not saved.
+    """
+
+    # Location and layout
+    path: str
+    shape: tuple[int, int, int]
+    normalizations: list[str]
+
+    # Events
+    events_name: list[str]
+    events_time: list[int]
+
+    # Neurons and trials
+    keep: Optional[np.ndarray]
+    neurons: Optional[np.ndarray]
+    clusters: Optional[np.ndarray]
+    trials: Optional[np.ndarray]
+    trials_valid: Optional[np.ndarray]
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the store at the given path. Only the metadata is read.
+        :param path: The directory of the store.
+        """
+
+        with open(os.path.join(path, META)) as file:
+            self._meta = json.load(file)
+        if self._meta['version'] != VERSION:
+            raise ValueError("Unsupported tensor store version {}.".format(self._meta['version']))
+
+        self.path = path
+        self.shape = tuple(self._meta['shape'])
+        self.normalizations = self._meta['normalizations']
+        self.events_name = self._meta['events_name']
+        self.events_time = self._meta['events_time']
+        self.keep = self._array('keep', bool)
+        self.neurons = self._array('neurons', np.int64)
+        self.clusters = self._array('clusters', None)
+        self.trials = self._array('trials', np.int64)
+        self.trials_valid = self._array('trials_valid', bool)
+
+    def _array(self, name: str, dtype: Optional[type]) -> Optional[np.ndarray]:
+        """
+        Convert an optional metadata list to an array.
+        """
+
+        return None if self._meta[name] is None else np.array(self._meta[name], dtype=dtype)
+
+    def __getitem__(self, normalization: str) -> ChunkedTensor:
+        """
+        Return the tensor of the given normalization without reading it.
+        :param normalization: The name of the normalization (e.g. 'minmax').
+        :return: A ChunkedTensor that reads blocks when indexed.
+        """
+
+        if normalization not in self.normalizations:
+            raise KeyError(normalization)
+        return ChunkedTensor(self.path, normalization, self._meta)
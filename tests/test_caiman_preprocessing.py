@@ -0,0 +1,112 @@
+import numpy as np
+
+import os
+import pytest
+
+from src.caiman_preprocessing import _memmap_info, memmap_filename, memmap_piece, save_memmap_pieces
+
+
+def make_memmap(directory, frames: int, dims: tuple[int, int], order: str) -> tuple[str, np.ndarray]:
+    """
+    Save a random movie as a memory mapped file the way CaImAn does.
+    :return: A tuple containing the file name and the (T, d1, d2) movie,
+        respectively.
+    """
+
+    movie = np.random.default_rng(0).random((frames,) + dims).astype(np.float32)
+    fname = memmap_filename(str(directory / 'movie_'), dims, frames, order=order)
+    Yr = np.memmap(fname, mode='w+', dtype=np.float32, shape=(dims[0] * dims[1], frames), order=order)
+    Yr[:] = np.reshape(movie, (frames, -1), order='F').T
+    Yr.flush()
+    return fname, movie
+
+
+def test_memmap_filename() -> None:
+    """
+    Test that file names round trip and match CaImAn's naming.
+    """
+
+    fname = memmap_filename('results/F147_0_memmap_', (247, 256), 21000)
+    assert fname == 'results/F147_0_memmap__d1_247_d2_256_d3_1_order_C_frames_21000_.mmap'
+    assert _memmap_info(fname) == ((247, 256), 21000, 'C')
+
+
+@pytest.mark.parametrize('order', ['C', 'F'])
+def test_memmap_piece(tmp_path, order: str) -> None:
+    """
+    Test that pieces are read-only views matching slices of the movie.
+    """
+
+    fname, movie = make_memmap(tmp_path, 30, (12, 8), order)
+    proc_slice = (slice(3, 10), slice(0, 8))
+    piece = memmap_piece(fname, proc_slice)
+    assert np.array_equal(piece, movie[:, 3:10, 0:8])
+    assert np.array_equal(memmap_piece(fname), movie)
+    assert isinstance(piece, np.memmap) and not piece.flags.writeable
+
+
+@pytest.mark.parametrize('order', ['C', 'F'])
+def test_save_memmap_pieces(tmp_path, order: str) -> None:
+    """
+    Test that every piece is saved in C order and loads back like CaImAn's
+    load_memmap followed by a reshape into images.
+    """
+
+    fname, movie = make_memmap(tmp_path, 25, (12, 8), order)
+    proc_slices = [(slice(0, 7), slice(0, 8)), (slice(7, 12), slice(2, 6))]
+    base_names = [str(tmp_path / 'piece_{}_memmap_'.format(i)) for i in range(2)]
+    fnames = save_memmap_pieces(fname, proc_slices, base_names, chunk_frames=4)
+
+    for fname_piece, proc_slice in zip(fnames, proc_slices):
+        expected = movie[:, proc_slice[0], proc_slice[1]]
+        dims, frames, order_piece = _memmap_info(fname_piece)
+        assert (dims, frames, order_piece) == (expected.shape[1:], 25, 'C')
+        Yr = np.memmap(fname_piece, mode='r', dtype=np.float32, shape=(int(np.prod(dims)), frames), order='C')
+        assert np.array_equal(np.reshape(Yr.T, [frames] + list(dims), order='F'), expected)
+
+
+def test_save_memmap_pieces_existing(tmp_path) -> None:
+    """
+    Test that pieces already saved are kept unless overwriting is requested.
+    """
+
+    fname, movie = make_memmap(tmp_path, 10, (6, 4), 'F')
+    proc_slices = [(slice(0, 3), slice(0, 4)), (slice(3, 6), slice(0, 4))]
+    base_names = [str(tmp_path / 'piece_{}_memmap_'.format(i)) for i in range(2)]
+    fnames = save_memmap_pieces(fname, proc_slices[:1], base_names[:1])
+
+    # Mark the first piece so that rewriting it would be noticed
+    Yr = np.memmap(fnames[0], mode='r+', dtype=np.float32, shape=(12, 10), order='C')
+    Yr[:] = -1
+    Yr.flush()
+
+    fnames = save_memmap_pieces(fname, proc_slices, base_names)
+    assert np.all(memmap_piece(fnames[0]) == -1)
+    assert np.array_equal(memmap_piece(fnames[1]), movie[:, 3:6])
+    fnames = save_memmap_pieces(fname, proc_slices, base_names, overwrite=True)
+    assert np.array_equal(memmap_piece(fnames[0]), movie[:, 0:3])
+
+
+def test_save_memmap_pieces_stale(tmp_path) -> None:
+    """
+    Test that pieces saved before the source was rewritten are saved again.
+    """
+
+    fname, movie = make_memmap(tmp_path, 10, (6, 4), 'F')
+    proc_slices = [(slice(0, 3), slice(0, 4)), (slice(3, 6), slice(0, 4))]
+    base_names = [str(tmp_path / 'piece_{}_memmap_'.format(i)) for i in range(2)]
+    fnames = save_memmap_pieces(fname, proc_slices, base_names)
+
+    # Rewrite the source as motion correction run again would, with a modification time after both pieces
+    source = np.memmap(fname, mode='r+', dtype=np.float32, shape=(24, 10), order='F')
+    source[:] = -source
+    source.flush()
+    del source
+    piece_time = os.path.getmtime(fnames[0])
+    os.utime(fnames[1], (piece_time + 2, piece_time + 2))
+    os.utime(fname, (piece_time + 1, piece_time + 1))
+
+    # Only the piece older than the source is saved again
+    fnames = save_memmap_pieces(fname, proc_slices, base_names)
+    assert np.array_equal(memmap_piece(fnames[0]), -movie[:, 0:3])
+    assert np.array_equal(memmap_piece(fnames[1]), movie[:, 3:6])
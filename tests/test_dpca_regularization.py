@@ -0,0 +1,122 @@
+import numpy as np
+
+import pytest
+
+from src.dpca_regularization import marginalize, regularization_sweep
+from src.tensor import centered_trial_average
+
+
+def make_trials(n_trials: int, n_stimuli: int) -> np.ndarray:
+    """
+    Create surrogate trial data similar to the dPCA code demo.
+    See https://github.com/machenslab/dPCA/blob/master/python/dPCA_demo.ipynb
+    """
+
+    rng = np.random.default_rng(0)
+    N, T, S = 20, 30, n_stimuli
+    zt = np.arange(T) / float(T)
+    zs = np.arange(S) / float(S)
+    trialR = 0.2 * rng.standard_normal((n_trials, N, S, T))
+    trialR += rng.standard_normal(N)[None, :, None, None] * zt[None, None, None, :]
+    trialR += rng.standard_normal(N)[None, :, None, None] * zs[None, None, :, None]
+    return trialR
+
+
+def test_marginalize_sum() -> None:
+    """
+    Test that the marginalizations add up to the centered trial averages.
+    """
+
+    data = centered_trial_average(make_trials(8, 3), trial_axis=0, neuron_axis=1)
+    margs = marginalize(data, 'st')
+    assert sorted(margs) == ['s', 'st', 't']
+    assert np.allclose(sum(margs.values()), data.reshape((data.shape[0], -1)))
+
+    joined = marginalize(data, 'st', join={'s': ['s', 'st']})
+    assert sorted(joined) == ['s', 't']
+    assert np.allclose(joined['s'], margs['s'] + margs['st'])
+
+
+def first_fold(data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Recreate the centered trial averages of the training and test trials of
+    the first of two folds shuffled with seed 0.
+    """
+
+    order = np.random.default_rng(0).permutation(data.shape[0])
+    test = np.sort(order[:data.shape[0] // 2])
+    train = np.setdiff1d(np.arange(data.shape[0]), test)
+    return centered_trial_average(data[train], 0, 1), centered_trial_average(data[test], 0, 1)
+
+
+def test_regularization_sweep_direct() -> None:
+    """
+    Test the scores of one fold against an explicit fit regularized like the
+    dPCA package, with a ridge of (lambda * sum(X**2))**2 and the encoder fit
+    to the data augmented with the ridge.
+    """
+
+    data = make_trials(10, 2)
+    lambdas = np.array([1e-3, 1e-5])
+    result = regularization_sweep(data, 'st', lambdas, n_components=2, n_splits=2, seed=0, n_processes=1)[1]
+
+    x_train, x_test = first_fold(data)
+    margs_train, margs_test = marginalize(x_train, 'st'), marginalize(x_test, 'st')
+    x_train, x_test = x_train.reshape((20, -1)), x_test.reshape((20, -1))
+
+    # Fit encoders and decoders directly for each regularization parameter
+    for i, lam in enumerate(lambdas):
+        mu = lam * np.sum(x_train ** 2)
+        residual = 0
+        for key in margs_train:
+            c = margs_train[key] @ x_train.T @ np.linalg.inv(x_train @ x_train.T + mu ** 2 * np.eye(20))
+            u = np.linalg.svd(np.hstack([c @ x_train, mu * c]))[0][:, :2]
+            residual += np.sum((margs_test[key] - u @ u.T @ c @ x_test) ** 2)
+        assert np.isclose(result[0, i], residual / np.sum(x_test ** 2))
+
+    # NumPy integers are accepted as the number of components
+    assert np.array_equal(regularization_sweep(data, 'st', lambdas, n_components=np.int64(2), n_splits=2, seed=0,
+                                               n_processes=1)[1], result)
+
+
+def test_regularization_sweep_dpca_package() -> None:
+    """
+    Test that regularization parameters mean the same as in the dPCA
+    package by fitting its encoders and decoders on the same fold.
+    """
+
+    dPCA = pytest.importorskip('dPCA.dPCA')
+    data = make_trials(10, 2)
+    lambdas = np.array([1e-2, 1e-4, 1e-6])
+    result = regularization_sweep(data, 'st', lambdas, n_components=2, n_splits=2, seed=0, n_processes=1)[1]
+
+    x_train, x_test = first_fold(data)
+    margs_train, margs_test = marginalize(x_train, 'st'), marginalize(x_test, 'st')
+    x_test = x_test.reshape((20, -1))
+
+    # Regularize and solve the same way as dPCA.dPCA._fit, with enough power iterations for its randomized SVD
+    # to converge
+    np.random.seed(0)
+    for i, lam in enumerate(lambdas):
+        dpca = dPCA.dPCA(labels='st', n_components=2, regularizer=lam, n_iter=50)
+        reg_x, reg_margs, preg_x = dpca._add_regularization(x_train, margs_train, lam * np.sum(x_train ** 2))
+        P, D = dpca._randomized_dpca(reg_x, reg_margs, pinvX=preg_x)
+        residual = sum(np.sum((margs_test[key] - P[key] @ D[key].T @ x_test) ** 2) for key in margs_test)
+        assert np.isclose(result[0, i], residual / np.sum(x_test ** 2))
+
+
+def test_regularization_sweep_single_stimulus() -> None:
+    """
+    Test a tensor with a single stimulus run on a process pool against the
+    same sweep run in the current process.
+    """
+
+    tensor_stim = np.expand_dims(make_trials(9, 1)[:, :, 0], axis=2)
+    join = {'s': ['s', 'st']}
+    lambdas, serial = regularization_sweep(tensor_stim, 'st', n_components=3, join=join, n_splits=3, seed=1,
+                                           n_processes=1)
+    parallel = regularization_sweep(tensor_stim, 'st', n_components=3, join=join, n_splits=3, seed=1,
+                                    n_processes=2)[1]
+    assert serial.shape == (3, lambdas.size)
+    assert np.all(np.isfinite(serial))
+    assert np.allclose(serial, parallel)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from src.factors import factor_similarity, project_factors, trial_reconstruction_error, trial_scores
+
+
+def make_factors(trials: int, neurons: int, times: int, rank: int) -> list[np.ndarray]:
+    """
+    Create random nonnegative factor matrices of a CP decomposition.
+    """
+
+    rng = np.random.default_rng(0)
+    return [rng.random((trials, rank)), rng.random((neurons, rank)), rng.random((times, rank))]
+
+
+def test_project_factors_loop() -> None:
+    """
+    Test that projections match the double loop used in the TCA notebook.
+    """
+
+    rng = np.random.default_rng(1)
+    tensor = rng.random((7, 5, 11))
+    neuron_factors = rng.random((5, 3))
+    expected = np.empty((3, 7, 11))
+    for i in range(3):
+        for trial in range(7):
+            expected[i, trial] = neuron_factors.T[i] @ tensor[trial]
+    result = project_factors(tensor, neuron_factors, chunk_size=3)
+    assert np.allclose(result, expected)
+
+
+def test_trial_scores_loop() -> None:
+    """
+    Test that scores match an explicit inner product for each trial and
+    component.
+    """
+
+    rng = np.random.default_rng(2)
+    tensor = rng.random((6, 4, 9))
+    neuron_factors, time_factors = rng.random((4, 2)), rng.random((9, 2))
+    expected = np.empty((6, 2))
+    for trial in range(6):
+        for r in range(2):
+            expected[trial, r] = np.sum(tensor[trial] * np.outer(neuron_factors[:, r], time_factors[:, r]))
+    result = trial_scores(tensor, neuron_factors, time_factors, chunk_size=4)
+    assert np.allclose(result, expected)
+
+
+def test_trial_reconstruction_error_exact() -> None:
+    """
+    Test that a tensor built from its own factors has no reconstruction error.
+    """
+
+    factors = make_factors(8, 6, 10, 3)
+    tensor = np.einsum('kr,nr,tr->knt', *factors)
+    result = trial_reconstruction_error(tensor, factors, chunk_size=3)
+    assert np.allclose(result, 0, atol=1e-6)
+
+
+def test_trial_reconstruction_error_noisy(tmp_path) -> None:
+    """
+    Test the relative errors against an explicit reconstruction, including
+    float32 computation on a memory-mapped tensor.
+    """
+
+    factors = make_factors(8, 6, 10, 3)
+    rng = np.random.default_rng(3)
+    tensor = np.einsum('kr,nr,tr->knt', *factors) + rng.random((8, 6, 10))
+    recon = np.einsum('kr,nr,tr->knt', *factors)
+    expected = np.linalg.norm((tensor - recon).reshape(8, -1), axis=1) / np.linalg.norm(tensor.reshape(8, -1), axis=1)
+    assert np.allclose(trial_reconstruction_error(tensor, factors), expected)
+
+    np.save(tmp_path / 'tensor.npy', tensor)
+    memmap = np.load(tmp_path / 'tensor.npy', mmap_mode='r')
+    result = trial_reconstruction_error(memmap, factors, chunk_size=2, dtype=np.float32)
+    assert np.allclose(result, expected, atol=1e-4)
+
+
+def test_factor_similarity_identity() -> None:
+    """
+    Test that factors are perfectly similar to themselves.
+    """
+
+    time_factors = make_factors(1, 1, 20, 4)[2]
+    result = factor_similarity(time_factors, time_factors)
+    assert np.allclose(np.diag(result), 1)
+    assert result.shape == (4, 4)
@@ -0,0 +1,54 @@
+import pytest
+
+import os
+import subprocess
+import sys
+
+
+# Modules that are slow to import and must only be imported when first used
+HEAVY_MODULES = ['caiman', 'scipy.interpolate', 'sklearn', 'tensorflow', 'cv2']
+
+# The largest allowed import time of a lightweight module in seconds, not counting NumPy
+IMPORT_BUDGET = 0.1
+
+
+def import_in_subprocess(module: str) -> tuple[float, list[str]]:
+    """
+    Import a module in a fresh interpreter after importing NumPy.
+    :param module: The name of the module to import.
+    :return: A tuple containing the import time in seconds and a list of heavy
+        modules that were imported, respectively.
+    """
+
+    code = ('import sys, time\n'
+            'import numpy\n'
+            'start = time.perf_counter()\n'
+            'import {}\n'
+            'print(time.perf_counter() - start)\n'
+            'print(",".join(m for m in {} if m in sys.modules))\n').format(module, HEAVY_MODULES)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    elapsed, heavy = output.stdout.splitlines()
+    return float(elapsed), [m for m in heavy.split(',') if m]
+
+
+@pytest.mark.parametrize('module', ['src.tensor', 'src.datetime'])
+def test_import_budget(module: str) -> None:
+    """
+    Test that lightweight modules import quickly. The best of three imports is
+    used to reduce noise.
+    """
+
+    elapsed = min(import_in_subprocess(module)[0] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET
+
+
+@pytest.mark.parametrize('module', ['src.tensor', 'src.datetime', 'src.interpolate', 'src.caiman_preprocessing',
+                                    'src.factors', 'src.dpca_regularization', 'src.online_line_removal',
+                                    'src.tensor_store'])
+def test_no_heavy_imports(module: str) -> None:
+    """
+    Test that importing a module does not import any heavy dependencies.
+    """
+
+    assert import_in_subprocess(module)[1] == []
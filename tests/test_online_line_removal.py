@@ -0,0 +1,101 @@
+import numpy as np
+
+import pytest
+
+from benchmarks.synthetic import make_movie
+from src.caiman_preprocessing import find_local_max, replace_rows
+from src.caiman_preprocessing_hyperparams import Hyperparams
+from src.online_line_removal import OnlineLineRemover, remove_lines_online
+
+
+# A small movie whose artifacts are close enough for their correction radii to overlap
+MOVIE = make_movie(frames=160, height=24, width=16, n_artifacts=12, artifact_rows=6)[0]
+
+
+def make_hyperparams(lr_proxy: bool) -> Hyperparams:
+    """
+    Create hyperparameters for line removal of the synthetic movie.
+    """
+
+    hyp = Hyperparams(name='test')
+    hyp.set_lr_params(local_max_thr=20, local_max_rad=8, channel_thr=1, correction_thr=25, correction_rad=6)
+    if lr_proxy:
+        hyp.set_lr_proxy_params(proxy_slices=[(slice(20, 24), slice(0, 10))])
+    return hyp
+
+
+def remove_lines_offline(movie: np.ndarray, hyp: Hyperparams) -> tuple[np.ndarray, np.ndarray, list]:
+    """
+    Remove lines and blank frames the same way as the preprocessing notebook.
+    :return: A tuple containing the indices of the kept frames, the edited
+        movie, and the local maxima, respectively.
+    """
+
+    movie_dgn = np.copy(movie)
+    if hyp.lr_proxy:
+        for rectangle in hyp.proxy_slices:
+            movie_dgn[:, rectangle[0], rectangle[1]] = np.nan
+    movie_dgn_means = np.nanmean(movie_dgn, axis=(1, 2))
+    local_max = find_local_max(movie_dgn_means, hyp.local_max_thr, hyp.local_max_rad)
+    movie_edit = np.copy(movie)
+    for point in local_max:
+        replace_rows(movie_edit, movie_dgn, point, hyp.channel_thr, hyp.correction_thr, hyp.correction_rad)
+    kept = np.flatnonzero(movie_dgn_means > hyp.channel_thr)
+    return kept, movie_edit[kept], local_max
+
+
+@pytest.mark.parametrize('lr_proxy', [False, True])
+def test_matches_offline(lr_proxy: bool) -> None:
+    """
+    Test that streaming frames gives the same frames as offline line and
+    blank removal.
+    """
+
+    hyp = make_hyperparams(lr_proxy)
+    kept, expected, local_max = remove_lines_offline(MOVIE, hyp)
+    assert len(local_max) == 12
+
+    remover = OnlineLineRemover(hyp)
+    emitted = list(remove_lines_online(MOVIE, hyp, remover))
+    assert [index for index, _ in emitted] == kept.tolist()
+    assert np.array_equal(np.array([frame for _, frame in emitted]), expected)
+    assert remover.local_max == local_max
+
+
+def test_integer_frames() -> None:
+    """
+    Test that integer frames, such as raw TIFF pages, can be streamed with
+    line removal by proxy and match the offline result on the loaded movie.
+    """
+
+    movie = MOVIE.astype(np.uint16)
+    hyp = make_hyperparams(True)
+    kept, expected, _ = remove_lines_offline(movie.astype(np.float32), hyp)
+    emitted = list(remove_lines_online(movie, hyp))
+    assert [index for index, _ in emitted] == kept.tolist()
+    assert np.array_equal(np.array([frame for _, frame in emitted]), expected)
+
+
+def test_bounded_latency() -> None:
+    """
+    Test that every frame is emitted a fixed number of frames after it
+    arrives and that the buffer does not grow.
+    """
+
+    remover = OnlineLineRemover(make_hyperparams(False))
+    for i, frame in enumerate(MOVIE):
+        for index, _ in remover.push(frame):
+            assert index == i - remover.latency
+    assert remover._frames.shape[0] == remover.latency + 1
+    assert [index for index, _ in remover.flush()][-1] == 159
+
+
+def test_replace_rows_keeps_first_frame() -> None:
+    """
+    Test that saving good rows does not overwrite the first frame of the
+    correction radius.
+    """
+
+    movie_edit = np.copy(MOVIE)
+    replace_rows(movie_edit, MOVIE, 48, 1, 25, 6)
+    assert np.array_equal(movie_edit[42], MOVIE[42])
@@ -0,0 +1,87 @@
+import numpy as np
+
+from scipy import stats
+
+from benchmarks.synthetic import make_traces
+from src.interpolate import interpolate, stitch, truncate
+from src.tensor import centered_trial_average, minmax, zscore
+
+
+# The largest allowed deviation of float32 results from float64 results, relative to the scale of the data
+TOLERANCE = 1e-5
+
+
+def assert_close(result: np.ndarray, expected: np.ndarray) -> None:
+    """
+    Check that a float32 result is close to the float64 result.
+    """
+
+    assert result.dtype == np.float32
+    assert result.shape == expected.shape
+    assert np.max(np.abs(result - expected)) <= TOLERANCE * np.max(np.abs(expected))
+
+
+def test_zscore_precision() -> None:
+    """
+    Test z-scoring against SciPy in both precisions.
+    """
+
+    traces = np.cumsum(np.random.default_rng(1).standard_normal((50, 2000)), axis=1)
+    expected = stats.zscore(traces, axis=1, ddof=1)
+    assert np.allclose(zscore(traces, axis=1), stats.zscore(traces, axis=1))
+    assert np.allclose(zscore(traces, axis=1, ddof=1), expected)
+    assert_close(zscore(traces.astype(np.float32), axis=1, ddof=1, dtype=np.float32), expected)
+    assert_close(zscore(traces.astype(np.float32), axis=1, ddof=1), expected)
+    assert zscore(np.arange(4), axis=0).dtype == np.float64
+
+
+def test_interpolate_precision() -> None:
+    """
+    Test interpolation of float32 traces.
+    """
+
+    traces = make_traces(neurons=50, frames=500)
+    time_start = np.datetime64('2021-05-26T13:45:12.345678')
+    time_end = time_start + np.timedelta64(int(80 / 4.5 * 10 ** 6), 'us')
+    expected = interpolate(traces, 67, time_start, time_end, 100, 180, 4.5)
+    result = interpolate(traces.astype(np.float32), 67, time_start, time_end, 100, 180, 4.5, dtype=np.float32)
+    assert_close(result, expected)
+
+
+def test_stitch_truncate_precision() -> None:
+    """
+    Test stitching and truncating float32 traces.
+    """
+
+    traces = make_traces(neurons=50, frames=500)
+    expected, expected_distance = stitch(traces, [2, 2], 100, 180, 4.5)
+    result, distance = stitch(traces.astype(np.float32), [2, 2], 100, 180, 4.5, dtype=np.float32)
+    assert_close(result, expected)
+    assert_close(distance, expected_distance)
+    assert_close(truncate(traces, 20, 100, dtype=np.float32), truncate(traces, 20, 100))
+
+
+def test_centered_trial_average_precision() -> None:
+    """
+    Test centered trial averages of a large float32 tensor with an offset,
+    where accumulating in float32 would lose precision.
+    """
+
+    tensor = 100 + np.random.default_rng(2).standard_normal((200, 30, 1, 100))
+    expected = centered_trial_average(tensor, 0, 1)
+    result = centered_trial_average(tensor.astype(np.float32), 0, 1)
+    assert result.dtype == np.float32
+    assert np.max(np.abs(result - expected)) <= TOLERANCE * 100
+    assert centered_trial_average(np.ones((2, 2, 2), dtype=np.int64), 0, 1).dtype == np.float64
+
+
+def test_minmax_precision() -> None:
+    """
+    Test min-max normalization of float32 data.
+    """
+
+    traces = make_traces(neurons=50, frames=2000)
+    expected = minmax(traces, axis=1)
+    assert_close(minmax(traces, axis=1, dtype=np.float32), expected)
+    assert_close(minmax(traces.astype(np.float32), axis=1), expected)
+    assert minmax(np.arange(4), axis=0).dtype == np.float64
@@ -0,0 +1,86 @@
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import os
+import tracemalloc
+
+from src import profiling
+from src.tensor import minmax
+
+
+def square(x: np.ndarray) -> np.ndarray:
+    """
+    A profiled function run in worker processes.
+    """
+
+    return profiling.profile(np.square)(x)
+
+
+def test_profile_disabled() -> None:
+    """
+    Test that nothing is recorded while profiling is off.
+    """
+
+    profiling.disable()
+    profiling.reset()
+    minmax(np.arange(10.0), axis=0)
+    with profiling.stage('unused'):
+        pass
+    assert profiling.get_records() == {}
+
+
+def test_profile_enabled(tmp_path, monkeypatch) -> None:
+    """
+    Test records of functions nested in a stage and the JSON and CSV reports.
+    """
+
+    for var in [profiling.ENV_ENABLED, profiling.ENV_MEMORY, profiling.ENV_DIR]:
+        monkeypatch.delenv(var, raising=False)
+    profiling.reset()
+    profiling.enable(memory=True)
+    try:
+        data = np.arange(100.0)
+        with profiling.stage('normalization'):
+            for _ in range(3):
+                minmax(data, axis=0)
+    finally:
+        profiling.disable()
+    assert not tracemalloc.is_tracing()
+
+    records = profiling.get_records()
+    assert records['src.tensor.minmax']['calls'] == 3
+    assert records['src.tensor.minmax']['array_bytes'] == 3 * data.nbytes
+    assert records['src.tensor.minmax']['peak_traced'] >= data.nbytes
+    assert records['normalization']['kind'] == 'stage'
+    assert records['normalization']['wall_time'] >= records['src.tensor.minmax']['wall_time']
+    assert records['normalization']['peak_traced'] >= records['src.tensor.minmax']['peak_traced']
+
+    profiling.write_report(str(tmp_path / 'report.json'))
+    profiling.write_report(str(tmp_path / 'report.csv'))
+    with open(tmp_path / 'report.json') as file:
+        assert {row['name'] for row in json.load(file)} == set(records)
+    with open(tmp_path / 'report.csv') as file:
+        assert {row['name'] for row in csv.DictReader(file)} == set(records)
+    profiling.reset()
+
+
+def test_profile_workers(tmp_path, monkeypatch) -> None:
+    """
+    Test that worker processes write their own records when they exit.
+    """
+
+    for var in [profiling.ENV_ENABLED, profiling.ENV_MEMORY, profiling.ENV_DIR]:
+        monkeypatch.delenv(var, raising=False)
+    profiling.reset()
+    profiling.enable(output_dir=str(tmp_path))
+    try:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            list(executor.map(square, [np.arange(4.0)] * 6))
+    finally:
+        profiling.disable()
+
+    records = profiling.merge_reports(str(tmp_path))
+    assert records['numpy.square']['calls'] == 6
+    assert all(name != 'profile_{}.json'.format(os.getpid()) for name in os.listdir(tmp_path))
@@ -0,0 +1,123 @@
+import numpy as np
+
+import pytest
+
+from src.tensor_store import TensorStore, save_tensor
+
+
+def make_store(path, compressed: bool) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Save z-scored and min-max normalized random tensors in a store.
+    :return: A tuple containing the z-scored and min-max normalized tensors,
+        respectively.
+    """
+
+    rng = np.random.default_rng(0)
+    tensor_zscore = rng.standard_normal((11, 13, 7)).astype(np.float32)
+    tensor_minmax = rng.random((11, 13, 7)).astype(np.float32)
+    save_tensor(str(path), {'zscore': tensor_zscore, 'minmax': tensor_minmax},
+                events_name=['laseron', 'turn_frame'], events_time=np.array([2, 5]),
+                keep=np.arange(15) % 7 != 3, neurons=np.flatnonzero(np.arange(15) % 7 != 3)[::-1],
+                clusters=np.sort(rng.integers(0, 3, 13)),
+                trials=list(range(2, 13)), trials_valid=[True] * 10 + [False], chunks=(4, 5), compressed=compressed)
+    return tensor_zscore, tensor_minmax
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_round_trip(tmp_path, compressed: bool) -> None:
+    """
+    Test that both normalizations and the metadata load back unchanged.
+    """
+
+    tensor_zscore, tensor_minmax = make_store(tmp_path / 'F147_tensor', compressed)
+    store = TensorStore(str(tmp_path / 'F147_tensor'))
+    assert np.array_equal(store['zscore'][:], tensor_zscore)
+    assert np.array_equal(np.asarray(store['minmax']), tensor_minmax)
+    assert store['minmax'][:].dtype == np.float32
+    assert store.shape == (11, 13, 7) and store.normalizations == ['zscore', 'minmax']
+    assert store.events_name == ['laseron', 'turn_frame'] and store.events_time == [2, 5]
+    assert np.sum(store.keep) == 13 and store.clusters.size == 13
+    assert np.array_equal(np.sort(store.neurons), np.flatnonzero(store.keep)) and store.neurons[0] == 14
+    assert store.trials[0] == 2 and not store.trials_valid[-1]
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+@pytest.mark.parametrize('key', [
+    (slice(None), slice(None), slice(2, 5)),
+    (slice(1, 10, 2), slice(3, 12)),
+    (3,),
+    (-1, 4, 6),
+    ([7, 0, 5], np.arange(13) % 2 == 0),
+    (slice(None), [12, 1], [0, 6]),
+    (Ellipsis, slice(0, 3)),
+    (1, Ellipsis),
+    ([3, 9], Ellipsis, 2),
+    (None,),
+    (0, None, 1)
+])
+def test_slices(tmp_path, compressed: bool, key: tuple) -> None:
+    """
+    Test that indexing matches indexing the tensor itself one axis at a time,
+    with an ellipsis standing for full slices, and that new axes are
+    rejected.
+    """
+
+    tensor_zscore = make_store(tmp_path / 'F147_tensor', compressed)[0]
+    tensor = TensorStore(str(tmp_path / 'F147_tensor'))['zscore']
+    if any(index is None for index in key):
+        with pytest.raises(IndexError):
+            tensor[key]
+        return
+
+    # Expand an ellipsis and index the tensor one axis at a time from the last
+    axes = [index for index in key if index is not Ellipsis]
+    if len(axes) < len(key):
+        position = next(i for i, index in enumerate(key) if index is Ellipsis)
+        axes[position:position] = [slice(None)] * (3 - len(axes))
+    expected = tensor_zscore
+    for axis, index in reversed(list(enumerate(axes))):
+        expected = expected[(slice(None),) * axis + (index,)]
+    assert np.array_equal(tensor[key], expected)
+
+
+def test_partial_read(tmp_path) -> None:
+    """
+    Test that reading a subset only opens the blocks containing it.
+    """
+
+    tensor_zscore = make_store(tmp_path / 'F147_tensor', False)[0]
+    tensor = TensorStore(str(tmp_path / 'F147_tensor'))['zscore']
+    opened = []
+    block = tensor._block
+    tensor._block = lambda i, j: opened.append((i, j)) or block(i, j)
+    assert np.array_equal(tensor[4:8, 0:5], tensor_zscore[4:8, 0:5])
+    assert opened == [(1, 0)]
+
+
+def test_overwrite(tmp_path) -> None:
+    """
+    Test that saving over a store replaces it entirely and that other
+    directories are not written into.
+    """
+
+    make_store(tmp_path / 'F147_tensor', False)
+    tensor = np.ones((3, 4, 5))
+    save_tensor(str(tmp_path / 'F147_tensor'), {'zscore': tensor}, [], [])
+    store = TensorStore(str(tmp_path / 'F147_tensor'))
+    assert store.normalizations == ['zscore'] and store.keep is None
+    assert np.array_equal(store['zscore'][:], tensor)
+    assert sorted(p.name for p in (tmp_path / 'F147_tensor').iterdir()) == ['meta.json', 'zscore']
+
+    (tmp_path / 'results').mkdir()
+    (tmp_path / 'results' / 'F147.tif').touch()
+    with pytest.raises(ValueError):
+        save_tensor(str(tmp_path / 'results'), {'zscore': tensor}, [], [])
+
+
+def test_mismatched_tensors(tmp_path) -> None:
+    """
+    Test that tensors of different shapes cannot be saved together.
+    """
+
+    with pytest.raises(ValueError):
+        save_tensor(str(tmp_path), {'zscore': np.zeros((2, 2, 2)), 'minmax': np.zeros((2, 2, 3))}, [], [])